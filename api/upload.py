@@ -10,7 +10,8 @@ import time
 from datetime import datetime, timedelta
 import aiofiles
 from starlette.middleware.base import BaseHTTPMiddleware
-from ocr.work import TableExtractor 
+from ocr.work import (TableExtractor, OCRCache, LLMCache, TemplateRegistry, prewarm_ocr_engines,
+                      shutdown_page_pools, close_llm_clients)
 app = FastAPI()
 logging.basicConfig(
     level=logging.INFO,
@@ -70,6 +71,56 @@ except Exception as e:
     logger.error(f"无法创建上传目录: {str(e)}")
 # 分块大小（8MB）
 CHUNK_SIZE = 8*1024*1024
+# 页面并行识别的工作进程数（1表示不启用多进程）和每个进程的推理线程数，两者乘积超过CPU核数时自动减少
+OCR_PAGE_WORKERS = int(os.getenv("OCR_PAGE_WORKERS", "1"))
+OCR_THREADS_PER_WORKER = int(os.getenv("OCR_THREADS_PER_WORKER", "2"))
+# OCR结果缓存目录和大小上限（MB），重复上传的PO直接使用缓存结果
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", str(Path(__file__).parent.parent / "cache" / "ocr")))
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "1024"))
+ocr_cache = OCRCache(OCR_CACHE_DIR, max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024)
+# 文字方向判断模式：auto（探测为横排且抽样确认不是倒置时跳过方向分类器）/ upright（PO均为正向）/ cls（始终分类）
+OCR_ORIENTATION = os.getenv("OCR_ORIENTATION", "auto")
+# 客户/供应商版面模板文件（JSON），匹配到模板的扫描页只识别模板中的区域
+OCR_LAYOUT_TEMPLATES = Path(os.getenv("OCR_LAYOUT_TEMPLATES", str(Path(__file__).parent.parent / "config" / "layout_templates.json")))
+layout_templates = TemplateRegistry.load(OCR_LAYOUT_TEMPLATES) if OCR_LAYOUT_TEMPLATES.exists() else None
+# 大模型回答缓存（SQLite，多个工作进程共用）、有效期（小时）和大小上限（MB）
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", str(Path(__file__).parent.parent / "cache" / "llm.sqlite3")))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", str(30 * 24)))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+llm_cache = LLMCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL_HOURS * 3600, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024)
+# 大模型接口：同时进行中的请求数上限、单次请求超时（秒）、单次调用总时限（秒）和最大重试次数
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "300"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+llm_options = {
+    "max_concurrency": LLM_MAX_CONCURRENCY,
+    "timeout": LLM_TIMEOUT,
+    "deadline": LLM_DEADLINE,
+    "max_retries": LLM_MAX_RETRIES,
+}
+# 大模型提取整张表格时使用流式接口，/status 可以看到已提取的商品数
+LLM_STREAM = os.getenv("LLM_STREAM", "0").lower() in ("1", "true", "yes")
+# 大模型输入超过该token数时分段并发提取，0表示不分段
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "0")) or None
+
+
+@app.on_event("startup")
+async def prewarm_ocr():
+    """服务启动时预加载OCR模型，避免第一个请求承担模型加载耗时"""
+    start_time = time.time()
+    try:
+        engine_count = await asyncio.to_thread(prewarm_ocr_engines)
+        logger.info(f"OCR模型预加载完成，引擎数: {engine_count}, 耗时: {time.time() - start_time:.3f}秒")
+    except Exception as e:
+        logger.error(f"OCR模型预加载失败: {str(e)}")
+
+
+@app.on_event("shutdown")
+async def shutdown_ocr_pools():
+    """服务关闭时释放页面识别工作进程和大模型接口的连接池"""
+    await asyncio.to_thread(shutdown_page_pools)
+    await asyncio.to_thread(close_llm_clients)
 
 
 async def process_file_upload(file_content: bytes, task_id: str, file_path: Path):
@@ -157,28 +208,60 @@ async def upload_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(
         })
         raise HTTPException(status_code=500, detail=f"文件上传准备失败: {str(e)}")
     #接下来处理PO单的核心逻辑
-    output_dir = 'output'
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    # 每个任务使用自己的输出目录，并行处理的任务不会覆盖彼此的结果文件
+    output_dir = os.path.join('output', task_id)
+    os.makedirs(output_dir, exist_ok=True)
         
-    # 初始化提取器
-    extractor = TableExtractor()
-    
     # 处理PDF文件
     pdf_path = file_path
     output_path = os.path.join(output_dir, 'table_data.md')
     
     try:
+        # 初始化提取器（OCR引擎来自进程内注册表，不会重复加载模型；未设置API密钥时报错）
+        extractor = TableExtractor(page_workers=OCR_PAGE_WORKERS, threads_per_worker=OCR_THREADS_PER_WORKER,
+                                   ocr_cache=ocr_cache, orientation=OCR_ORIENTATION,
+                                   layout_templates=layout_templates, llm_cache=llm_cache,
+                                   llm_options=llm_options, llm_stream=LLM_STREAM,
+                                   llm_chunk_tokens=LLM_CHUNK_TOKENS)
+        
         # 处理文档
-        formatted_table = extractor.process_document(pdf_path, output_path)
+        upload_tasks[task_id].update({
+            "extraction_status": "processing",
+            "rows_extracted": 0
+        })
+
+        def on_item(item, header):
+            # 每提取出一个商品更新一次任务状态（在工作线程中调用）
+            upload_tasks[task_id]["rows_extracted"] = extractor.rows_extracted
+
+        # OCR和大模型调用在工作线程中进行，不阻塞事件循环，处理期间 /status 可以正常返回
+        formatted_table = await asyncio.to_thread(extractor.process_document, pdf_path, output_path, on_item)
+        extraction = extractor.extraction
+        # 没有商品为失败；有商品但提取不完整（大模型回答中断、分段提取失败、补全字段失败）为部分完成
+        if not extraction.items:
+            extraction_status = "failed"
+        elif extraction.item_errors:
+            extraction_status = "partial"
+        else:
+            extraction_status = "completed"
+        # 记录本任务的提取方式和大模型输入压缩前后的token数
+        upload_tasks[task_id].update({
+            "extraction_status": extraction_status,
+            "extraction_errors": extraction.item_errors,
+            "output_dir": output_dir,
+            "extraction_mode": extractor.extraction_mode,
+            "prompt_stats": extractor.prompt_stats
+        })
        
         print(f"\nMarkdown格式的表格数据已保存到: {output_path}")
         print("\nMarkdown格式的表格内容预览:")
         print(formatted_table)
     except FileNotFoundError as e:
+        upload_tasks[task_id].update({"extraction_status": "failed", "last_error": str(e)})
         print(f"错误: {str(e)}")
         print("请确保PDF文件存在于正确的路径中。")
     except Exception as e:
+        upload_tasks[task_id].update({"extraction_status": "failed", "last_error": str(e)})
         print(f"处理过程中出现错误: {str(e)}")
 
 @app.post("/api/upload/zip")
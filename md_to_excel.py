@@ -1,42 +1,26 @@
-import pandas as pd
 import os
-import re
+from tools.po_fields import POExtraction
+from tools.markdown_table import parse_markdown_table
 
 def md_to_excel(md_file_path, excel_file_path):
-    """将Markdown表格转换为Excel文件"""
+    """将Markdown表格（或 table_data.json 提取结果）转换为Excel文件"""
     try:
+        if md_file_path.endswith('.json'):
+            # 结构化的提取结果直接展开，不需要解析Markdown
+            with open(md_file_path, 'r', encoding='utf-8') as f:
+                df = POExtraction.from_json(f.read()).to_dataframe()
+            df.to_excel(excel_file_path, index=False, engine='openpyxl')
+            print(f"\nExcel文件已保存到: {excel_file_path}")
+            return True
+        
         # 读取Markdown文件
         with open(md_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 移除可能的markdown标记
-        content = content.strip()
-        if content.startswith('```markdown'):
-            content = content[10:]
-        if content.endswith('```'):
-            content = content[:-3]
-        content = content.strip()
-        
-        # 分割行
-        lines = content.split('\n')
-        
-        # 移除空行
-        lines = [line for line in lines if line.strip()]
-        
-        # 提取表头
-        header = lines[0].strip('|').split('|')
-        header = [h.strip() for h in header]
-        
-        # 提取数据行
-        data = []
-        for line in lines[2:]:  # 跳过表头和分隔行
-            if line.strip('|').strip():  # 确保不是空行
-                row = line.strip('|').split('|')
-                row = [cell.strip() for cell in row]
-                data.append(row)
-        
-        # 创建DataFrame
-        df = pd.DataFrame(data, columns=header)
+            df, rejected = parse_markdown_table(f.read())
+        for row in rejected:
+            print(f"跳过第 {row['line']} 行: {row['reason']}")
+        if df.empty:
+            print("警告：没有提取到有效的数据行！")
+            return False
         
         # 保存为Excel文件
         df.to_excel(excel_file_path, index=False, engine='openpyxl')
@@ -51,11 +35,17 @@ def main():
     # 设置输入输出路径
     input_dir = 'output'
     md_file = 'table_data.md'
+    json_file = 'table_data.json'
     excel_file = 'table_data.xlsx'
     
     md_path = os.path.join(input_dir, md_file)
     excel_path = os.path.join(input_dir, excel_file)
     
+    # 优先使用结构化的提取结果
+    json_path = os.path.join(input_dir, json_file)
+    if os.path.exists(json_path):
+        md_path = json_path
+    
     # 检查输入文件是否存在
     if not os.path.exists(md_path):
         print(f"错误: Markdown文件不存在: {md_path}")
@@ -8,7 +8,6 @@ from order.order_info import extract_all_info
 from tools.commodity_name_handle import split_instrument_name,extract_purchase_order_no,extract_basic_unit
 from tools.time_tools import convert_date_format
 from tools.excel_tools import ExcelTools,set_cell_style,get_start_no,sum_k_column_and_save
-order = extract_all_info(excel_file_path = "../output/table_data_formatted.xlsx")
 
 
 def handle_headers(order,ws):
@@ -56,9 +55,15 @@ def handle_item_list(ws,order,start_row, start_no, move_down_by):
             # set_date_format(cell)
         start_row += 1
 
-if __name__ == "__main__":
-    excel_path = "../output/对账单格式.xlsx"
-    output_path = "../output/对账单格式_new.xlsx"
+def write_statement(order, excel_path, output_path):
+    """
+    将订单写入对账单模板
+    
+    Args:
+        order: Order对象，可以直接使用 TableExtractor.process_document 之后的 extractor.order
+        excel_path: 对账单模板路径
+        output_path: 输出文件路径
+    """
     wb = load_workbook(excel_path)
     ws = wb.active
     start_no = get_start_no(ws)
@@ -85,5 +90,10 @@ if __name__ == "__main__":
     print(f"文件已保存到: {output_path}")
 
 
+if __name__ == "__main__":
+    order = extract_all_info(excel_file_path = "../output/table_data_formatted.xlsx")
+    write_statement(order, "../output/对账单格式.xlsx", "../output/对账单格式_new.xlsx")
+
+
    
                                        
\ No newline at end of file
@@ -1,40 +1,155 @@
 import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Union
 import numpy as np
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+
+# 客户字段映射
+CUSTOMER_FIELDS = {
+    "客户公司名称": "customer_name",
+    "客户地址": "customer_address",
+    "客户电话": "customer_phone",
+    "客户传真": "customer_fax"
+}
+
+# 供应商字段映射
+SUPPLIER_FIELDS = {
+    "供应厂商代号": "supplier_code",
+    "供应厂商公司名称": "supplier_name",
+    "供应厂商地址": "supplier_address",
+    "供应商电话": "supplier_phone",
+    "供应商联系人": "supplier_contact_person"
+}
+
+# 商品字段映射
+COMMODITY_FIELDS = {
+    "项次": "item_no",
+    "料件编号": "material_no",
+    "品名(MPN)": "product_name",
+    "规格": "specification",
+    "计价单位": "pricing_unit",
+    "计价数量": "pricing_quantity",
+    "税前单价": "price_before_tax",
+    "税前金额": "amount_before_tax",
+    "交货日": "delivery_date",
+    "请购单号": "requisition_no",
+    "采购数量": "purchase_quantity",
+    "含税单价": "price_with_tax",
+    "含税金额": "amount_with_tax",
+    "采购单位": "purchase_unit"
+}
+
+# 订单字段映射
+ORDER_FIELDS = {
+    "采购单号": "purchase_order_no",
+    "采购日期": "purchase_date",
+    "付款条件": "payment_terms",
+    "税种": "tax_type",
+    "币种": "currency",
+    "税前金额合计": "total_before_tax",
+    "税后金额合计": "total_after_tax",
+    "增值税税额合计": "total_vat"
+}
+
+# 需要转换为Decimal的商品字段
+COMMODITY_DECIMAL_FIELDS = ["pricing_quantity", "price_before_tax", "amount_before_tax",
+                            "purchase_quantity", "price_with_tax", "amount_with_tax"]
+
+# 商品字段 -> 表头
+COMMODITY_HEADERS = {field_name: header for header, field_name in COMMODITY_FIELDS.items()}
+
+# 表格中没有对应值时使用的默认值
+CUSTOMER_DEFAULTS = {
+    "customer_name": "未知公司",
+    "customer_address": "未知地址",
+    "customer_phone": "未知电话",
+    "customer_fax": "未知传真"
+}
+
+SUPPLIER_DEFAULTS = {
+    "supplier_code": "未知代号",
+    "supplier_name": "未知供应商",
+    "supplier_address": "未知地址",
+    "supplier_phone": "未知电话",
+    "supplier_contact_person": "未知联系人"
+}
+
+COMMODITY_DEFAULTS = {
+    "item_no": "",
+    "material_no": "",
+    "product_name": "",
+    "specification": "",
+    "pricing_unit": "",
+    "pricing_quantity": 0,
+    "price_before_tax": 0,
+    "amount_before_tax": 0,
+    "delivery_date": None,
+    "requisition_no": "",
+    "purchase_quantity": 0,
+    "price_with_tax": 0,
+    "amount_with_tax": 0,
+    "purchase_unit": ""
+}
+
+ORDER_DEFAULTS = {
+    "purchase_order_no": "未知单号",
+    "purchase_date": "未知日期",
+    "payment_terms": "未知付款条件",
+    "tax_type": "未知税种",
+    "currency": "未知币种"
+}
+
+
+class _Record:
+    """
+    使用 __slots__ 保存属性的记录基类，每个对象不再单独带一个 __dict__
+
+    __dict__ 属性返回按字段顺序排列的新字典，print 和 Model.create(**obj.__dict__) 的用法不变；
+    修改该字典不会修改对象
+    """
+    __slots__ = ()
+
+    @property
+    def __dict__(self):
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    def __str__(self):
+        attrs = []
+        for attr, value in self.__dict__.items():
+            attrs.append(f"{attr}: {value}")
+        return "\n".join(attrs)
+
+
 # 客户信息类
-class Customer:
+class Customer(_Record):
+    __slots__ = ("customer_name", "customer_address", "customer_phone", "customer_fax")
+
     def __init__(self, customer_name,customer_address, customer_phone, customer_fax):
         self.customer_name = customer_name    # 客户公司名称
         self.customer_address = customer_address              # 客户地址
         self.customer_phone = customer_phone                  # 客户电话
         self.customer_fax = customer_fax                      # 客户传真
-    
-    def __str__(self):
-        attrs = []
-        for attr, value in self.__dict__.items():
-            attrs.append(f"{attr}: {value}")
-        return "\n".join(attrs)
 
 
 # 供应商信息类
-class Supplier:
+class Supplier(_Record):
+    __slots__ = ("supplier_code", "supplier_name", "supplier_address", "supplier_phone", "supplier_contact_person")
+
     def __init__(self, supplier_code, supplier_name, supplier_address, supplier_phone, supplier_contact_person):
         self.supplier_code = supplier_code                        # 供应厂商代号
         self.supplier_name = supplier_name                        # 供应厂商名称
         self.supplier_address = supplier_address                  # 供应厂商地址
         self.supplier_phone = supplier_phone                      # 供应商电话
         self.supplier_contact_person = supplier_contact_person    # 供应商联系人
-    
-    def __str__(self):
-        attrs = []
-        for attr, value in self.__dict__.items():
-            attrs.append(f"{attr}: {value}")
-        return "\n".join(attrs)
 
 
 # 商品信息类
-class Commodity:
+class Commodity(_Record):
+    # 顺序与 __init__ 的参数一致，bulk 按该顺序传参
+    __slots__ = ("item_no", "material_no", "product_name", "specification",
+                 "pricing_unit", "pricing_quantity", "price_before_tax", "amount_before_tax",
+                 "delivery_date", "requisition_no", "purchase_quantity", "price_with_tax",
+                 "amount_with_tax", "purchase_unit")
+
     def __init__(self, item_no, material_no, product_name, specification, 
                  pricing_unit, pricing_quantity, price_before_tax, amount_before_tax,
                  delivery_date, requisition_no, purchase_quantity, price_with_tax,
@@ -54,15 +169,25 @@ class Commodity:
         self.amount_with_tax = amount_with_tax          # 含税金额
         self.purchase_unit = purchase_unit              # 采购单位
     
-    def __str__(self):
-        attrs = []
-        for attr, value in self.__dict__.items():
-            attrs.append(f"{attr}: {value}")
-        return "\n".join(attrs)
+    @classmethod
+    def bulk(cls, columns: Dict[str, List[Any]]) -> List["Commodity"]:
+        """
+        按列一次构建多个商品
+
+        Args:
+            columns: {字段名: 该字段的值列表}，需要包含所有字段，各列长度相同
+
+        Returns:
+            Commodity对象列表
+        """
+        return list(map(cls, *(columns[attr] for attr in cls.__slots__)))
 
 
 # 订单信息类
-class Order:
+class Order(_Record):
+    __slots__ = ("purchase_order_no", "purchase_date", "payment_terms", "tax_type", "currency",
+                 "customer", "supplier", "total_before_tax", "total_after_tax", "total_vat", "items")
+
     def __init__(self, purchase_order_no, purchase_date, payment_terms, tax_type, currency,
                  customer, supplier, total_before_tax=0, total_after_tax=0, total_vat=0):
         self.purchase_order_no = purchase_order_no  # 采购单号
@@ -80,220 +205,146 @@ class Order:
     def add_item(self, commodity):
         """添加商品到订单项目列表中"""
         self.items.append(commodity)
-    
-    def __str__(self):
-        attrs = []
-        for attr, value in self.__dict__.items():
-            attrs.append(f"{attr}: {value}")
-        return "\n".join(attrs)
 
-def extract_supplier_info(excel_file_path: str) -> Supplier:
+class OrderSheet:
+    """只解析一次的订单表格：表头位置只查找一次，数据按列保存"""
+
+    def __init__(self, source: Union[str, pd.DataFrame]):
+        """
+        Args:
+            source: Excel文件路径，或内存中的DataFrame（列名为表头）
+        """
+        if isinstance(source, pd.DataFrame):
+            header = list(source.columns)
+            body = source
+        else:
+            sheet = pd.read_excel(source, header=None)
+            header = sheet.iloc[0].tolist() if len(sheet) else []
+            body = sheet.iloc[1:]
+        
+        # 检查数据是否至少有两行（表头行和数据行）
+        if len(body) < 1:
+            raise ValueError("Excel文件至少需要包含表头行和一行数据")
+        
+        # 表头 -> 列位置，重复的表头以最后一列为准
+        self.indices = {name: i for i, name in enumerate(header) if isinstance(name, str)}
+        self.columns = []
+        for i in range(len(header)):
+            values = body.iloc[:, i].to_numpy(dtype=object)
+            # 空字符串在Excel中是空单元格，读取后为NaN，这里保持一致
+            self.columns.append(np.where(pd.isna(values) | (values == ""), None, values))
+        self.length = len(body)
+    
+    def column(self, name):
+        """按表头取一列，空单元格为None；表头不存在时返回None"""
+        index = self.indices.get(name)
+        return None if index is None else self.columns[index]
+    
+    def first_row(self, fields: Dict[str, str], defaults: Dict[str, Any]) -> Dict[str, Any]:
+        """取第一行数据中的订单级字段，空单元格使用默认值"""
+        values = dict(defaults)
+        for header, field_name in fields.items():
+            column = self.column(header)
+            if column is not None and column[0] is not None:
+                values[field_name] = column[0]
+        return values
+
+
+def _as_sheet(source) -> OrderSheet:
+    return source if isinstance(source, OrderSheet) else OrderSheet(source)
+
+
+def _to_decimal(value, field_name):
+    """商品数值字段转换为Decimal，无法转换时记为0"""
+    try:
+        if isinstance(value, str):
+            value = value.strip().replace(',', '')
+        return Decimal(str(value))
+    except (ValueError, TypeError, InvalidOperation):
+        print(f"Failed to convert value for field {field_name}")
+        return Decimal('0')
+
+
+def _decimal_column(values, field_name, default):
+    """整列转换为Decimal：同一列中重复的数量、单价只转换一次（Decimal不可变，可以共用）"""
+    converted = {}
+    result = []
+    for value in values:
+        if value is None:
+            result.append(default)
+            continue
+        # 非字符串的值按 str(value) 转换，和字符串共用同一个键
+        key = str(value)
+        number = converted.get(key)
+        if number is None:
+            number = converted[key] = _to_decimal(key, field_name)
+        result.append(number)
+    return result
+
+
+def extract_supplier_info(excel_file_path: Union[str, pd.DataFrame, OrderSheet]) -> Supplier:
     """
     从Excel文件中提取供应商信息
     
     Args:
-        excel_file_path: Excel文件路径
+        excel_file_path: Excel文件路径，内存中的DataFrame（列名为表头），或已解析的OrderSheet
         
     Returns:
         Supplier对象
     """
-    # 读取Excel文件
-    df = pd.read_excel(excel_file_path, header=None)
-    
-    # 检查数据是否至少有两行（表头行和数据行）
-    if len(df) < 2:
-        raise ValueError("Excel文件至少需要包含表头行和一行数据")
-    
-    # 获取表头行和数据行
-    header_row = df.iloc[0]
-    data_row = df.iloc[1]
-    
-    # 供应商字段映射
-    supplier_fields = {
-        "供应厂商代号": "supplier_code",
-        "供应厂商公司名称": "supplier_name",
-        "供应厂商地址": "supplier_address",
-        "供应商电话": "supplier_phone",
-        "供应商联系人": "supplier_contact_person"
-    }
-    
-    # 提取供应商信息
-    supplier_data = {
-        "supplier_code": "未知代号",
-        "supplier_name": "未知供应商",
-        "supplier_address": "未知地址",
-        "supplier_phone": "未知电话",
-        "supplier_contact_person": "未知联系人"
-    }
-    
-    # 查找并提取供应商信息
-    for i, header in enumerate(header_row):
-        if isinstance(header, str) and header in supplier_fields:
-            value = data_row[i]
-            if pd.notna(value):  # 检查值是否为NaN
-                field_name = supplier_fields[header]
-                supplier_data[field_name] = value
-    
-    # 创建并返回供应商对象
-    return Supplier(**supplier_data)
+    return Supplier(**_as_sheet(excel_file_path).first_row(SUPPLIER_FIELDS, SUPPLIER_DEFAULTS))
 
-def extract_customer_info(excel_file_path: str) -> Customer:
+def extract_customer_info(excel_file_path: Union[str, pd.DataFrame, OrderSheet]) -> Customer:
     """
     从Excel文件中提取客户信息
     
     Args:
-        excel_file_path: Excel文件路径
+        excel_file_path: Excel文件路径，内存中的DataFrame（列名为表头），或已解析的OrderSheet
         
     Returns:
         Customer对象
     """
-    # 读取Excel文件
-    df = pd.read_excel(excel_file_path, header=None)
-    
-    # 检查数据是否至少有两行（表头行和数据行）
-    if len(df) < 2:
-        raise ValueError("Excel文件至少需要包含表头行和一行数据")
-    
-    # 获取表头行和数据行
-    header_row = df.iloc[0]
-    data_row = df.iloc[1]
-    
-    # 客户字段映射
-    customer_fields = {
-        "客户公司名称": "customer_name",
-        "客户地址": "customer_address",
-        "客户电话": "customer_phone",
-        "客户传真": "customer_fax"
-    }
-    
-    # 提取客户信息
-    customer_data = {
-        "customer_name": "未知公司",
-        "customer_address": "未知地址",
-        "customer_phone": "未知电话",
-        "customer_fax": "未知传真"
-    }
-    
-    # 查找并提取客户信息
-    for i, header in enumerate(header_row):
-        if isinstance(header, str) and header in customer_fields:
-            value = data_row[i]
-            if pd.notna(value):  # 检查值是否为NaN
-                field_name = customer_fields[header]
-                customer_data[field_name] = value
-    
-    # 创建并返回客户对象
-    return Customer(**customer_data)
+    return Customer(**_as_sheet(excel_file_path).first_row(CUSTOMER_FIELDS, CUSTOMER_DEFAULTS))
 
-def extract_commodities(excel_file_path: str) -> List[Commodity]:
+def extract_commodities(excel_file_path: Union[str, pd.DataFrame, OrderSheet]) -> List[Commodity]:
     """
-    从Excel文件中提取商品信息（可能有多行）
+    从Excel文件中提取商品信息（可能有多行），按列转换后一次构建所有商品
     
     Args:
-        excel_file_path: Excel文件路径
+        excel_file_path: Excel文件路径，内存中的DataFrame（列名为表头），或已解析的OrderSheet
         
     Returns:
         Commodity对象列表
     """
-    # 读取Excel文件
-    df = pd.read_excel(excel_file_path, header=None)
-    
-    # 检查数据是否至少有两行（表头行和至少一行数据）
-    if len(df) < 2:
-        raise ValueError("Excel文件至少需要包含表头行和一行数据")
-    
-    # 获取表头行
-    header_row = df.iloc[0]
-    
-    # 商品字段映射
-    commodity_fields = {
-        "项次": "item_no",
-        "料件编号": "material_no",
-        "品名(MPN)": "product_name",
-        "规格": "specification",
-        "计价单位": "pricing_unit",
-        "计价数量": "pricing_quantity",
-        "税前单价": "price_before_tax",
-        "税前金额": "amount_before_tax",
-        "交货日": "delivery_date",
-        "请购单号": "requisition_no",
-        "采购数量": "purchase_quantity",
-        "含税单价": "price_with_tax",
-        "含税金额": "amount_with_tax",
-        "采购单位": "purchase_unit"
-    }
-    
-    # 创建表头索引映射
-    header_indices = {}
-    for i, header in enumerate(header_row):
-        if isinstance(header, str) and header in commodity_fields:
-            header_indices[commodity_fields[header]] = i
-    
-    # 从第二行开始提取商品信息
-    commodities = []
-    for row_idx in range(1, len(df)):
-        data_row = df.iloc[row_idx]
-        
-        # 检查这一行是否包含商品信息（通常检查关键字段是否有值）
-        # 这里我们检查料件编号或品名是否有值
-        material_no_idx = header_indices.get("material_no", -1)
-        product_name_idx = header_indices.get("product_name", -1)
-        
-        has_material_no = material_no_idx >= 0 and pd.notna(data_row[material_no_idx])
-        has_product_name = product_name_idx >= 0 and pd.notna(data_row[product_name_idx])
-        
-        if not (has_material_no or has_product_name):
-            # 如果既没有料件编号也没有品名，则跳过这一行
-            continue
-        
-        # 提取商品信息
-        commodity_data = {
-            "item_no": "",
-            "material_no": "",
-            "product_name": "",
-            "specification": "",
-            "pricing_unit": "",
-            "pricing_quantity": 0,
-            "price_before_tax": 0,
-            "amount_before_tax": 0,
-            "delivery_date": None,
-            "requisition_no": "",
-            "purchase_quantity": 0,
-            "price_with_tax": 0,
-            "amount_with_tax": 0,
-            "purchase_unit": ""
-        }
-        
-        # 从数据行中提取值
-        for field, idx in header_indices.items():
-            value = data_row[idx]
-            if pd.notna(value):
-                # 根据字段类型进行转换
-                if field in ["pricing_quantity", "price_before_tax", "amount_before_tax", 
-                             "purchase_quantity", "price_with_tax", "amount_with_tax"]:
-                    try:
-                        # print(f"Converting field {field} with value: {value} (type: {type(value)})")
-                        if isinstance(value, str):
-                            value = value.strip().replace(',', '')
-                        commodity_data[field] = Decimal(str(value))
-                    except (ValueError, TypeError, decimal.InvalidOperation):
-                        print(f"Failed to convert value for field {field}")     
-                        commodity_data[field] = Decimal('0')
-                else:
-                    commodity_data[field] = str(value)
-        
-        # 创建商品对象并添加到列表
-        commodity = Commodity(**commodity_data)
-        commodities.append(commodity)
-    
-    return commodities
+    sheet = _as_sheet(excel_file_path)
+    
+    # 既没有料件编号也没有品名的行跳过
+    keep = np.zeros(sheet.length, dtype=bool)
+    for header in ("料件编号", "品名(MPN)"):
+        column = sheet.column(header)
+        if column is not None:
+            keep |= pd.notna(column)
+    rows = np.flatnonzero(keep)
+    
+    # 每个字段一列：表格中没有的字段使用默认值
+    columns = {}
+    for field_name, default in COMMODITY_DEFAULTS.items():
+        column = sheet.column(COMMODITY_HEADERS[field_name])
+        if column is None:
+            columns[field_name] = [default] * len(rows)
+        elif field_name in COMMODITY_DECIMAL_FIELDS:
+            columns[field_name] = _decimal_column(column[rows], field_name, default)
+        else:
+            columns[field_name] = [default if value is None else str(value) for value in column[rows]]
+    
+    return Commodity.bulk(columns)
 
-def extract_order_info(excel_file_path: str, customer: Customer, supplier: Supplier, commodities: List[Commodity]) -> Order:
+def extract_order_info(excel_file_path: Union[str, pd.DataFrame, OrderSheet], customer: Customer, supplier: Supplier, commodities: List[Commodity]) -> Order:
     """
     从Excel文件中提取订单信息，并关联客户、供应商和商品信息
     
     Args:
-        excel_file_path: Excel文件路径
+        excel_file_path: Excel文件路径，内存中的DataFrame（列名为表头），或已解析的OrderSheet
         customer: 客户对象
         supplier: 供应商对象
         commodities: 商品对象列表
@@ -301,50 +352,8 @@ def extract_order_info(excel_file_path: str, customer: Customer, supplier: Suppl
     Returns:
         Order对象
     """
-    # 读取Excel文件
-    df = pd.read_excel(excel_file_path, header=None)
-    
-    # 检查数据是否至少有两行（表头行和数据行）
-    if len(df) < 2:
-        raise ValueError("Excel文件至少需要包含表头行和一行数据")
-    
-    # 获取表头行和数据行
-    header_row = df.iloc[0]
-    data_row = df.iloc[1]
-    
-    # 订单字段映射
-    order_fields = {
-        "采购单号": "purchase_order_no",
-        "采购日期": "purchase_date",
-        "付款条件": "payment_terms",
-        "税种": "tax_type",
-        "币种": "currency",
-        "税前金额合计": "total_before_tax",
-        "税后金额合计": "total_after_tax",
-        "增值税税额合计": "total_vat"
-    }
-    
-    # 提取订单信息
-    order_data = {
-        "purchase_order_no": "未知单号",
-        "purchase_date": "未知日期",
-        "payment_terms": "未知付款条件",
-        "tax_type": "未知税种",
-        "currency": "未知币种",
-        "customer": customer,
-        "supplier": supplier
-    }
-    
-    # 查找并提取订单信息
-    for i, header in enumerate(header_row):
-        if isinstance(header, str) and header in order_fields:
-            value = data_row[i]
-            field_name = order_fields[header]
-            if pd.notna(value):  # 检查值是否为NaN
-                order_data[field_name] = value
-    
-    # 创建订单对象
-    order = Order(**order_data)
+    order_data = _as_sheet(excel_file_path).first_row(ORDER_FIELDS, ORDER_DEFAULTS)
+    order = Order(customer=customer, supplier=supplier, **order_data)
     
     # 将商品添加到订单中
     for commodity in commodities:
@@ -353,10 +362,22 @@ def extract_order_info(excel_file_path: str, customer: Customer, supplier: Suppl
     return order
 
 
-def extract_all_info(excel_file_path: str) -> Order:
-    customer = extract_customer_info(excel_file_path)
-    supplier = extract_supplier_info(excel_file_path)
-    commodities = extract_commodities(excel_file_path)
-    order = extract_order_info(excel_file_path, customer, supplier, commodities)
-    return order
+def load_order(source: Union[str, pd.DataFrame, OrderSheet]) -> Order:
+    """
+    读取订单表格并构建订单：表格只解析一次，客户、供应商、商品和订单信息都从同一份数据中取
+
+    Args:
+        source: Excel文件路径，内存中的DataFrame（列名为表头），或已解析的OrderSheet
+
+    Returns:
+        Order对象
+    """
+    sheet = _as_sheet(source)
+    customer = extract_customer_info(sheet)
+    supplier = extract_supplier_info(sheet)
+    commodities = extract_commodities(sheet)
+    return extract_order_info(sheet, customer, supplier, commodities)
+
 
+def extract_all_info(excel_file_path: Union[str, pd.DataFrame]) -> Order:
+    return load_order(excel_file_path)
@@ -0,0 +1,233 @@
+import time
+from collections import deque
+import cv2
+from tools.page_ocr import (PageResult, render_page, preprocess_image, extract_text_layer, crop_text_line,
+                            find_image_regions, find_table_grids, DEFAULT_OCR_OPTIONS)
+from tools.table_grid import grids_from_drawings
+from tools.orientation import needs_cls, sample_upright, ORIENTATION_AUTO
+
+# 默认识别批大小
+DEFAULT_REC_BATCH_SIZE = 32
+
+
+def sort_boxes(boxes):
+    """按从上到下、从左到右的阅读顺序排列文本框（与PaddleOCR的排序规则一致）"""
+    boxes = sorted(boxes, key=lambda box: (box[0][1], box[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+class _PageJob:
+    """正在识别中的页面：已知文本行 + 等待识别的文本行"""
+
+    def __init__(self, page_num, source, dpi, lines=None, boxes=None, start=None, template=None):
+        self.page_num = page_num
+        self.source = source
+        self.dpi = dpi
+        self.lines = list(lines or [])
+        self.boxes = list(boxes or [])
+        self.scores = [1.0] * len(self.lines)   # 文本层的行置信度为1.0
+        self.template = template
+        self.labels = [None] * len(self.lines)
+        self.tables = []
+        self.pending = 0
+        self.cls_skipped = 0
+        self.timings = {}
+        self.start = start if start is not None else time.perf_counter()
+
+    def reserve(self, box, label=None):
+        """为一个待识别的文本行占位，返回其下标"""
+        self.lines.append(None)
+        self.boxes.append(box)
+        self.labels.append(label)
+        self.scores.append(0.0)
+        self.pending += 1
+        return len(self.lines) - 1
+
+    def add(self, text, box, score, label=None):
+        """加入一个已经识别过的文本行"""
+        self.lines.append(text)
+        self.boxes.append(box)
+        self.labels.append(label)
+        self.scores.append(score)
+
+    def fill(self, index, text, score):
+        self.lines[index] = text
+        self.scores[index] = score
+        self.pending -= 1
+
+    def result(self, drop_score):
+        """所有文本行识别完成后生成页面结果，去掉空文本和低置信度的行"""
+        keep = [i for i, text in enumerate(self.lines) if text and self.scores[i] >= drop_score]
+        self.timings["total"] = time.perf_counter() - self.start
+        return PageResult(self.page_num, [self.lines[i] for i in keep], [self.boxes[i] for i in keep],
+                          [self.scores[i] for i in keep], self.source, self.dpi, self.timings,
+                          self.cls_skipped, self.template,
+                          [self.labels[i] for i in keep] if self.template else None, self.tables)
+
+
+class CrossPageRecognizer:
+    """
+    跨页面的批量文本识别
+
+    检测逐页进行，检测出的文本行按固定批大小凑满后统一送入识别模型，
+    批次可以包含来自多个页面、多个文件的文本行，识别结果按 (页面, 下标) 写回；
+    方向分类器只对需要的文本行运行
+    """
+
+    def __init__(self, engine, batch_size=DEFAULT_REC_BATCH_SIZE, use_cls=True):
+        """
+        Args:
+            engine: PaddleOCR引擎
+            batch_size (int): 识别批大小
+            use_cls (bool): 是否允许运行方向分类器（引擎需要启用 use_angle_cls）
+        """
+        self.engine = engine
+        self.batch_size = batch_size
+        self.use_cls = use_cls and getattr(engine, "use_angle_cls", False)
+        self.drop_score = getattr(engine, "drop_score", 0.5)
+        self._queue = []            # [(page_job, 行下标, 文本行图片, 是否需要方向分类), ...]
+        self.batches = 0
+        self.lines = 0
+
+    def detect(self, image):
+        """检测图片中的文本框"""
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        dt_boxes, _ = self.engine.text_detector(image)
+        if dt_boxes is None:
+            return []
+        return sort_boxes([box.tolist() for box in dt_boxes])
+
+    def add(self, job, index, crop, cls=True):
+        """加入一个待识别的文本行，凑满一批时立即识别"""
+        self._queue.append((job, index, crop, cls and self.use_cls))
+        if len(self._queue) >= self.batch_size:
+            self._run(self._queue[:self.batch_size])
+            del self._queue[:self.batch_size]
+
+    def flush(self):
+        """识别队列中剩余的文本行"""
+        while self._queue:
+            self._run(self._queue[:self.batch_size])
+            del self._queue[:self.batch_size]
+
+    def _run(self, batch):
+        start = time.perf_counter()
+        crops = [crop for _, _, crop, _ in batch]
+        cls_indices = [i for i, item in enumerate(batch) if item[3]]
+        if cls_indices:
+            cls_crops, _, _ = self.engine.text_classifier([crops[i] for i in cls_indices])
+            for i, crop in zip(cls_indices, cls_crops):
+                crops[i] = crop
+        rec_res, _ = self.engine.text_recognizer(crops)
+        elapsed = time.perf_counter() - start
+        for (job, index, _, _), (text, score) in zip(batch, rec_res):
+            job.fill(index, text, float(score))
+            # 按文本行数分摊批次耗时
+            job.timings["ocr"] = job.timings.get("ocr", 0) + elapsed / len(batch)
+        self.batches += 1
+        self.lines += len(batch)
+
+
+def _queue_region(recognizer, job, page, dpi, clip, options, label=None):
+    """渲染并检测页面（或区域），把文本行加入识别队列"""
+    cls = needs_cls(page, clip, options.orientation)
+    start = time.perf_counter()
+    pix, gray = render_page(page, dpi, clip)
+    image = preprocess_image(gray, options.preprocess)
+    job.timings["render"] = job.timings.get("render", 0) + time.perf_counter() - start
+    if options.detect_tables:
+        job.tables.extend(find_table_grids(image, dpi, clip, job.timings))
+
+    start = time.perf_counter()
+    boxes = recognizer.detect(image)
+    scale = 72 / dpi
+    offset_x, offset_y = (clip.x0, clip.y0) if clip else (0, 0)
+    crops = [crop_text_line(image, box) for box in boxes]
+    job.timings["det"] = job.timings.get("det", 0) + time.perf_counter() - start
+    if not cls and options.orientation == ORIENTATION_AUTO and recognizer.use_cls:
+        # 投影只能确定是横排，抽样确认不是倒置的
+        start = time.perf_counter()
+        cls = not sample_upright(recognizer.engine, crops)
+        job.timings["cls_sample"] = job.timings.get("cls_sample", 0) + time.perf_counter() - start
+    if not (cls and recognizer.use_cls):
+        job.cls_skipped += len(boxes)
+    for box, crop in zip(boxes, crops):
+        index = job.reserve([[x * scale + offset_x, y * scale + offset_y] for x, y in box], label)
+        recognizer.add(job, index, crop, cls)
+
+
+def iter_batched_pages(recognizer, pages, options=DEFAULT_OCR_OPTIONS):
+    """
+    以跨页批量识别的方式逐页识别，按输入的页面顺序返回结果
+
+    pages 可以包含多个文件的页面，以便凑满识别批次；
+    批量模式下不会因为置信度低而提高DPI重新识别；版面模板的匹配区域不参与批次，
+    每份文件只在第一张扫描页上匹配，其余页面沿用匹配结果
+
+    Args:
+        recognizer (CrossPageRecognizer): 批量识别器，可在多个文件之间共用
+        pages: fitz.Page 对象的可迭代序列
+        options (OCROptions): 识别参数
+
+    Yields:
+        PageResult: 单页识别结果
+    """
+    pending = deque()
+    matches = {}  # 文件对象 id -> 该文件的 TemplateMatch
+    for page in pages:
+        start = time.perf_counter()
+        text_layer = extract_text_layer(page) if options.use_text_layer else None
+        template = None
+        if text_layer is None and options.templates:
+            timings = {}
+            document = id(page.parent)
+            match = matches.get(document)
+            if match is None:
+                match = options.templates.match(recognizer.engine, page, options, timings)
+                matches[document] = match.for_next_page()
+            template = match.template
+        if text_layer is None and template is not None:
+            job = _PageJob(page.number + 1, "ocr", None, start=start, template=template.name)
+            job.timings.update(timings)
+            for layout_region in template.regions:
+                for rect, reused in match.split(layout_region, page):
+                    if reused is not None:
+                        # 匹配时已经识别过这部分
+                        for text, box, score in reused:
+                            job.add(text, box, score, layout_region.name)
+                        job.dpi = max(job.dpi or 0, match.dpi or 0) or None
+                        continue
+                    region_dpi = options.dpi or options.policy.choose_dpi(page, rect)
+                    job.dpi = max(job.dpi or 0, region_dpi)
+                    _queue_region(recognizer, job, page, region_dpi, rect, options, layout_region.name)
+        elif text_layer is None:
+            chosen_dpi = options.dpi or options.policy.choose_dpi(page)
+            job = _PageJob(page.number + 1, "ocr", chosen_dpi, start=start)
+            _queue_region(recognizer, job, page, chosen_dpi, None, options)
+        else:
+            job = _PageJob(page.number + 1, "text_layer", None,
+                           lines=[text for text, _ in text_layer],
+                           boxes=[[[x0, y0], [x1, y0], [x1, y1], [x0, y1]] for _, (x0, y0, x1, y1) in text_layer],
+                           start=start)
+            if options.detect_tables:
+                job.tables.extend(grids_from_drawings(page))
+            for rect in find_image_regions(page, [box for _, box in text_layer]):
+                region_dpi = options.dpi or options.policy.choose_dpi(page, rect)
+                job.dpi = max(job.dpi or 0, region_dpi)
+                _queue_region(recognizer, job, page, region_dpi, rect, options)
+        pending.append(job)
+
+        # 前面的页面所有文本行都识别完成后立即返回
+        while pending and pending[0].pending == 0:
+            yield pending.popleft().result(recognizer.drop_score)
+
+    recognizer.flush()
+    while pending:
+        yield pending.popleft().result(recognizer.drop_score)
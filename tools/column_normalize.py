@@ -0,0 +1,101 @@
+import re
+import pandas as pd
+
+# 日期和时间之间缺少空格："24/08/2114:32:32" -> "24/08/21 14:32:32"
+_DATETIME_GAP = re.compile(r"^(\d{2}/\d{2}/\d{2})\s*(\d{2}:\d{2}:\d{2})$")
+# 千分位和OCR在数字中插入的空格："1, 000. 000000" -> "1000.000000"
+_NUMBER_NOISE = re.compile(r"[,，\s]")
+_NUMBER = re.compile(r"^-?\d+(?:\.\d+)?$")
+# 单位只保留开头的英文代码："PCS(个、台、块、辆)" -> "PCS"
+_UNIT_CODE = re.compile(r"^([A-Za-z]+)")
+# 采购单号只保留编号部分："231-2408000555国内采购单" -> "231-2408000555"
+_ORDER_NO = re.compile(r"(\d+-\d+)")
+
+# 各类需要整理的列
+DATETIME_COLUMNS = ["采购日期"]
+AMOUNT_COLUMNS = ["计价数量", "税前单价", "税前金额", "采购数量", "含税单价", "含税金额",
+                  "税前金额合计", "税后金额合计", "增值税税额合计"]
+UNIT_COLUMNS = ["计价单位", "采购单位"]
+ORDER_NO_COLUMNS = ["采购单号"]
+
+
+def _datetime(values):
+    return values.str.strip().str.replace(_DATETIME_GAP, r"\1 \2", regex=True), None
+
+
+def _amount(values):
+    cleaned = values.str.replace(_NUMBER_NOISE, "", regex=True)
+    valid = cleaned.str.match(_NUMBER).eq(True)
+    # 无法识别为数字的值保持原样，单独计数（空值不计）
+    return cleaned.where(valid, values), values.notna() & values.ne("") & ~valid
+
+
+def _unit(values):
+    code = values.str.extract(_UNIT_CODE, expand=False)
+    return code.fillna(values), None
+
+
+def _order_no(values):
+    number = values.str.extract(_ORDER_NO, expand=False)
+    return number.fillna(values), None
+
+
+# 列类型 -> (整理函数, 列名列表)
+NORMALIZERS = {
+    "datetime": (_datetime, DATETIME_COLUMNS),
+    "amount": (_amount, AMOUNT_COLUMNS),
+    "unit": (_unit, UNIT_COLUMNS),
+    "order_no": (_order_no, ORDER_NO_COLUMNS),
+}
+
+
+def normalize_columns(df, kinds=tuple(NORMALIZERS)):
+    """
+    整理订单表格中的日期、金额、单位和采购单号列，整列一次处理，直接修改传入的DataFrame
+
+    - 采购日期：日期和时间之间补空格
+    - 数量、单价、金额：去掉千分位和OCR插入的空格，保留原有的小数位数（定点数字符串）
+    - 计价单位、采购单位：只保留英文代码，例如 PCS
+    - 采购单号：只保留 xxx-xxxxxxxxxx 编号部分
+
+    只处理字符串单元格，空值和已经是数字的单元格保持不变
+
+    Args:
+        df (DataFrame): 订单表格
+        kinds: 需要整理的列类型，见 NORMALIZERS
+
+    Returns:
+        dict: 修改摘要 {列名: {"changed": 修改的单元格数, "invalid": 无法整理的单元格数, "example": (原值, 新值)}}，
+            只包含有修改或有无法整理的值的列
+    """
+    summary = {}
+    for kind in kinds:
+        transform, columns = NORMALIZERS[kind]
+        for column in columns:
+            if column not in df.columns:
+                continue
+            values = df[column]
+            if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+                continue
+            # 非字符串单元格经过 .str 运算后为NaN，不会被修改
+            normalized, invalid = transform(values.str.strip())
+            changed = normalized.notna() & normalized.ne(values)
+            changed_count = int(changed.sum())
+            invalid_count = int(invalid.sum()) if invalid is not None else 0
+            if not changed_count and not invalid_count:
+                continue
+            entry = {"changed": changed_count, "invalid": invalid_count}
+            if changed_count:
+                first = changed.idxmax()
+                entry["example"] = (values[first], normalized[first])
+                df.loc[changed, column] = normalized[changed]
+            summary[column] = entry
+    return summary
+
+
+def format_summary(summary):
+    """将修改摘要格式化为一行文本"""
+    if not summary:
+        return "没有需要整理的值"
+    return "; ".join(f"{column}: 修改 {entry['changed']}" + (f", 无法整理 {entry['invalid']}" if entry["invalid"] else "")
+                     for column, entry in summary.items())
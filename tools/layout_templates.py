@@ -0,0 +1,252 @@
+import json
+import time
+import fitz  # PyMuPDF
+from tools.page_ocr import ocr_region
+
+# 默认的供应商识别区域：页面顶部 20%（PO抬头通常印有客户/供应商名称）
+DEFAULT_PROBE_BBOX = (0.0, 0.0, 1.0, 0.2)
+
+# 区域类型
+REGION_FIELD = "field"   # 抬头、合计、页脚等字段块
+REGION_TABLE = "table"   # 商品明细表
+
+# 模板区域减去匹配区域后剩余的边角小于该尺寸（pt，约一行文字高度）时不再识别
+MIN_REMAINDER = 8
+
+
+class LayoutRegion:
+    """版面模板中的一个识别区域，坐标为相对页面宽高的比例（0~1），不受页面尺寸影响"""
+
+    def __init__(self, name, bbox, kind=REGION_FIELD):
+        """
+        Args:
+            name (str): 区域名称，识别结果按该名称标注（例如 header、items、totals）
+            bbox: (x0, y0, x1, y1) 相对页面宽高的比例
+            kind (str): 区域类型，field / table
+        """
+        self.name = name
+        self.bbox = tuple(float(v) for v in bbox)
+        self.kind = kind
+
+    def rect(self, page):
+        """区域在页面中的实际位置"""
+        return _to_rect(page, self.bbox)
+
+    def to_dict(self):
+        return {"name": self.name, "bbox": list(self.bbox), "kind": self.kind}
+
+
+class LayoutTemplate:
+    """某个客户/供应商PO的固定版面"""
+
+    def __init__(self, name, keywords, regions, probe=DEFAULT_PROBE_BBOX):
+        """
+        Args:
+            name (str): 模板名称（通常是客户或供应商名称）
+            keywords: 识别区域中出现任一关键词即认为匹配该模板
+            regions: LayoutRegion 列表，只识别这些区域
+            probe: 用于匹配模板的识别区域 (x0, y0, x1, y1)，相对页面宽高的比例
+        """
+        self.name = name
+        self.keywords = [_normalize(keyword) for keyword in keywords]
+        self.regions = list(regions)
+        self.probe = tuple(float(v) for v in probe)
+
+    def matches(self, text):
+        """判断识别到的文字中是否包含模板的关键词"""
+        text = _normalize(text)
+        return any(keyword and keyword in text for keyword in self.keywords)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            name=data["name"],
+            keywords=data.get("keywords", [data["name"]]),
+            regions=[LayoutRegion(**region) for region in data["regions"]],
+            probe=data.get("probe", DEFAULT_PROBE_BBOX),
+        )
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "keywords": self.keywords,
+            "regions": [region.to_dict() for region in self.regions],
+            "probe": list(self.probe),
+        }
+
+
+class TemplateMatch:
+    """
+    一份文件的模板匹配结果
+
+    文件只在第一张扫描页上识别匹配区域，其余页面直接使用匹配到的模板（或识别整页）；
+    第一张页面识别模板区域时复用匹配区域的识别结果，不再重复识别同一块区域
+    """
+
+    def __init__(self, template=None, probe=None, lines=(), boxes=(), scores=(), dpi=None):
+        """
+        Args:
+            template (LayoutTemplate): 匹配的模板，没有匹配时为 None
+            probe (fitz.Rect, optional): 本页已识别的匹配区域，其余页面为 None
+            lines, boxes, scores: 匹配区域的识别结果（页面坐标）
+            dpi (int, optional): 识别匹配区域使用的DPI
+        """
+        self.template = template
+        self.probe = probe
+        self.lines = list(lines)
+        self.boxes = list(boxes)
+        self.scores = list(scores)
+        self.dpi = dpi
+
+    def for_next_page(self):
+        """文件其余页面使用的匹配结果：沿用模板，没有可复用的识别结果"""
+        return TemplateMatch(self.template)
+
+    def split(self, region, page):
+        """
+        拆分模板区域：已在匹配区域中识别过的部分直接复用，其余部分需要识别
+
+        只有匹配区域包含模板区域，或模板区域包含匹配区域时才复用；
+        表格区域始终整块识别，避免表格线被拆开
+
+        Args:
+            region (LayoutRegion): 模板区域
+            page: fitz.Page 对象
+
+        Returns:
+            list: [(区域, 复用的文本行)]，复用的文本行为 [(文字, 文本框, 置信度)]，
+                为 None 时需要识别该区域
+        """
+        rect = region.rect(page)
+        if self.probe is None or region.kind == REGION_TABLE or not rect.intersects(self.probe):
+            return [(rect, None)]
+        if self.probe.contains(rect):
+            return [(rect, self._lines_in(rect))]
+        if not rect.contains(self.probe):
+            return [(rect, None)]
+        probe = self.probe
+        above = fitz.Rect(rect.x0, rect.y0, rect.x1, probe.y0)
+        left = fitz.Rect(rect.x0, probe.y0, probe.x0, probe.y1)
+        right = fitz.Rect(probe.x1, probe.y0, rect.x1, probe.y1)
+        below = fitz.Rect(rect.x0, probe.y1, rect.x1, rect.y1)
+        parts = [(part, None) for part in (above, left, right) if _usable(part)]
+        parts.insert(1 if _usable(above) else 0, (probe, self._lines_in(rect)))
+        if _usable(below):
+            parts.append((below, None))
+        return parts
+
+    def _lines_in(self, rect):
+        """中心点落在区域内的文本行"""
+        found = []
+        for text, box, score in zip(self.lines, self.boxes, self.scores):
+            x = sum(point[0] for point in box) / len(box)
+            y = sum(point[1] for point in box) / len(box)
+            if rect.contains(fitz.Point(x, y)):
+                found.append((text, box, score))
+        return found
+
+
+class TemplateRegistry:
+    """
+    版面模板注册表
+
+    扫描件页面先识别模板的匹配区域（默认页面顶部），按关键词确定客户/供应商后，
+    只渲染和识别模板中的区域，识别结果按区域名称标注；没有匹配的模板时识别整页
+    """
+
+    def __init__(self, templates=None):
+        self._templates = {}
+        for template in templates or []:
+            self.register(template)
+
+    def register(self, template):
+        """注册模板，同名模板会被覆盖"""
+        self._templates[template.name] = template
+
+    def get(self, name):
+        return self._templates.get(name)
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __iter__(self):
+        return iter(self._templates.values())
+
+    @classmethod
+    def load(cls, path):
+        """
+        从JSON文件加载模板
+
+        文件内容为模板列表，例如:
+            [{"name": "某某公司", "keywords": ["某某公司"], "probe": [0, 0, 1, 0.2],
+              "regions": [{"name": "header", "bbox": [0, 0.05, 1, 0.3]},
+                          {"name": "items", "bbox": [0, 0.3, 1, 0.8], "kind": "table"}]}]
+
+        Args:
+            path: JSON文件路径
+
+        Returns:
+            TemplateRegistry
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([LayoutTemplate.from_dict(data) for data in json.load(f)])
+
+    def save(self, path):
+        """保存为JSON文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.signature(), f, ensure_ascii=False, indent=2)
+
+    def signature(self):
+        """所有模板的内容，参与OCR缓存key的计算"""
+        return [template.to_dict() for template in self._templates.values()]
+
+    def match(self, engine, page, options, timings=None):
+        """
+        识别页面的匹配区域，确定匹配的模板
+
+        所有模板的匹配区域合并后只识别一次；每份文件只需在第一张扫描页上调用，
+        其余页面使用返回结果的 for_next_page()
+
+        Args:
+            engine: PaddleOCR引擎
+            page: fitz.Page 对象
+            options (OCROptions): 识别参数
+            timings (dict, optional): 累加各阶段耗时
+
+        Returns:
+            TemplateMatch: 匹配结果，没有匹配时 template 为 None
+        """
+        if not self._templates:
+            return TemplateMatch()
+        start = time.perf_counter()
+        clip = fitz.Rect()
+        for template in self._templates.values():
+            clip |= _to_rect(page, template.probe)
+        lines, boxes, scores, dpi, _ = ocr_region(engine, page, clip=clip, options=options, timings=timings)
+        text = "".join(lines)
+        matched = next((template for template in self._templates.values() if template.matches(text)), None)
+        if timings is not None:
+            timings["template_match"] = timings.get("template_match", 0) + time.perf_counter() - start
+        return TemplateMatch(matched, clip, lines, boxes, scores, dpi)
+
+    def carry(self, name):
+        """根据模板名称还原文件其余页面使用的匹配结果（用于工作进程之间传递）"""
+        return TemplateMatch(self.get(name) if name else None)
+
+
+def _normalize(text):
+    """去掉空白字符，避免OCR在文字之间插入的空格影响关键词匹配"""
+    return "".join(text.split())
+
+
+def _usable(rect):
+    """剩余的边角是否值得识别"""
+    return rect.width >= MIN_REMAINDER and rect.height >= MIN_REMAINDER
+
+
+def _to_rect(page, bbox):
+    """将相对比例坐标转换为页面坐标"""
+    x0, y0, x1, y1 = bbox
+    rect = page.rect
+    return fitz.Rect(rect.x0 + x0 * rect.width, rect.y0 + y0 * rect.height,
+                     rect.x0 + x1 * rect.width, rect.y0 + y1 * rect.height)
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+# 默认缓存有效期（秒）
+DEFAULT_TTL = 30 * 24 * 3600
+# 默认缓存总大小上限（字节）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_text(text):
+    """压缩空白字符、去掉空行，只有空白不同的OCR文本得到相同的缓存key"""
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class LLMCache:
+    """
+    大模型回答的持久化缓存
+
+    保存在SQLite数据库中，多个API工作进程可以共用同一个文件；
+    超过有效期的回答视为未命中，总大小超过上限时按最近使用时间淘汰
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            path: 数据库文件路径
+            ttl (float): 缓存有效期（秒），None表示永不过期
+            max_bytes (int): 缓存总大小上限（字节）
+        """
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        # 每次操作使用独立的连接，可以在多个线程、多个进程中同时使用
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.isolation_level = None
+        return _Connection(conn)
+
+    @staticmethod
+    def make_key(model, messages, params, prompt_version):
+        """
+        计算请求的缓存key
+
+        Args:
+            model (str): 模型名称
+            messages: 对话消息列表，内容会先压缩空白字符
+            params (dict): 采样参数（temperature 等）
+            prompt_version: 提示词版本，提示词修改后旧缓存自动失效
+
+        Returns:
+            str: 缓存key
+        """
+        payload = {
+            "model": model,
+            "messages": [{"role": message["role"], "content": normalize_text(message["content"])}
+                         for message in messages],
+            "params": params,
+            "prompt_version": prompt_version,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        读取缓存的回答
+
+        Args:
+            key (str): 缓存key
+
+        Returns:
+            str: 命中时返回回答内容，否则返回 None
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and row[1] < now - self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, response):
+        """
+        写入回答，必要时淘汰过期和最久未使用的缓存
+
+        Args:
+            key (str): 缓存key
+            response (str): 回答内容
+        """
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                         (key, response, now, now, size))
+            evicted = 0
+            if self.ttl is not None:
+                evicted += conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # 从最久未使用的开始淘汰，至少保留刚写入的回答
+                for old_key, old_size in conn.execute(
+                        "SELECT key, size FROM responses WHERE key != ? ORDER BY accessed", (key,)).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= old_size
+                    evicted += 1
+            conn.execute("COMMIT")
+        with self._lock:
+            self.evictions += evicted
+
+    def clear(self):
+        """清空缓存"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._connect() as conn:
+            entries, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "total_bytes": total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class _Connection:
+    """用完即关闭的SQLite连接（sqlite3.Connection 的 with 语句只提交事务，不关闭连接）"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+        self._conn.close()
@@ -0,0 +1,319 @@
+import json
+import queue
+import asyncio
+import random
+import threading
+import time
+import httpx
+
+# 同时进行中的请求数上限
+DEFAULT_MAX_CONCURRENCY = 4
+# 单次请求超时（秒）和连接超时（秒）
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# 一次调用（包括重试）的总时限（秒）
+DEFAULT_DEADLINE = 300.0
+# 最大重试次数和退避时间（秒）
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 30.0
+# 需要重试的HTTP状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 进程内共享的客户端: (api_url, api_key, 参数) -> LLMClient
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """大模型接口调用失败（重试后仍失败或超过总时限）"""
+
+
+class LLMClient:
+    """
+    大模型接口的异步客户端
+
+    所有请求在客户端自己的事件循环线程中执行，共用一个保持长连接的连接池，
+    同时进行中的请求数受 max_concurrency 限制；
+    遇到 429/5xx 和网络错误时按带随机抖动的指数退避重试
+    """
+
+    def __init__(self, api_url, api_key, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, deadline=DEFAULT_DEADLINE,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF):
+        """
+        Args:
+            api_url (str): chat/completions 接口地址
+            api_key (str): API密钥
+            max_concurrency (int): 同时进行中的请求数上限
+            timeout (float): 单次请求超时（秒）
+            connect_timeout (float): 连接超时（秒）
+            deadline (float): 一次调用（包括重试）的默认总时限（秒）
+            max_retries (int): 最大重试次数
+            backoff (float): 第一次重试前的最大等待时间（秒），之后每次翻倍
+            max_backoff (float): 重试等待时间上限（秒）
+        """
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests = 0
+        self.retries = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        self._client = None
+        self._semaphore = None
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self):
+        # 连接池和信号量需要在客户端的事件循环中创建
+        self._client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _retry_delay(self, attempt, response=None):
+        """第 attempt 次重试前的等待时间，优先使用服务端返回的 Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.max_backoff)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _post(self, payload, deadline):
+        """在客户端的事件循环中发送请求，失败时重试"""
+        end = time.monotonic() + deadline
+        last_error = None
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                response = None
+                self.requests += 1
+                try:
+                    response = await self._client.post(self.api_url, json=payload,
+                                                       timeout=min(self.timeout, remaining))
+                    if response.status_code not in RETRY_STATUS:
+                        response.raise_for_status()
+                        return response.json()
+                    last_error = LLMError(f"接口返回 {response.status_code}: {response.text[:200]}")
+                except httpx.HTTPStatusError as e:
+                    # 其他4xx错误重试也不会成功
+                    raise LLMError(f"接口返回 {e.response.status_code}: {e.response.text[:200]}") from e
+                except httpx.TransportError as e:
+                    last_error = LLMError(f"网络错误: {type(e).__name__}: {e}")
+                if attempt == self.max_retries:
+                    break
+                delay = self._retry_delay(attempt, response)
+                if time.monotonic() + delay >= end:
+                    break
+                self.retries += 1
+                await asyncio.sleep(delay)
+        raise last_error or LLMError(f"超过总时限 {deadline} 秒")
+
+    async def _stream(self, payload, deadline, emit):
+        """
+        在客户端的事件循环中发送流式请求，每收到一段回答调用一次 emit
+
+        只在还没有收到任何内容时重试，已经交给调用方的内容无法撤回
+        """
+        end = time.monotonic() + deadline
+        last_error = None
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                response = None
+                received = False
+                self.requests += 1
+                try:
+                    async with self._client.stream("POST", self.api_url, json=payload,
+                                                   timeout=min(self.timeout, remaining)) as response:
+                        if response.status_code in RETRY_STATUS:
+                            await response.aread()
+                            last_error = LLMError(f"接口返回 {response.status_code}: {response.text[:200]}")
+                        elif response.status_code >= 400:
+                            # 其他4xx错误重试也不会成功
+                            await response.aread()
+                            raise LLMError(f"接口返回 {response.status_code}: {response.text[:200]}")
+                        else:
+                            lines = response.aiter_lines()
+                            try:
+                                async for line in lines:
+                                    if time.monotonic() > end:
+                                        raise LLMError(f"超过总时限 {deadline} 秒")
+                                    if not line.startswith("data:"):
+                                        continue
+                                    data = line[5:].strip()
+                                    if data == "[DONE]":
+                                        break
+                                    choices = json.loads(data).get("choices") or [{}]
+                                    delta = (choices[0].get("delta") or {}).get("content")
+                                    if delta:
+                                        received = True
+                                        emit(delta)
+                            finally:
+                                await lines.aclose()
+                            return
+                except httpx.TransportError as e:
+                    if received:
+                        raise LLMError(f"接收回答时网络中断: {type(e).__name__}: {e}") from e
+                    last_error = LLMError(f"网络错误: {type(e).__name__}: {e}")
+                if attempt == self.max_retries:
+                    break
+                delay = self._retry_delay(attempt, response)
+                if time.monotonic() + delay >= end:
+                    break
+                self.retries += 1
+                await asyncio.sleep(delay)
+        raise last_error or LLMError(f"超过总时限 {deadline} 秒")
+
+    def _submit(self, payload, deadline):
+        return asyncio.run_coroutine_threadsafe(self._post(payload, deadline or self.deadline), self._loop)
+
+    def _submit_stream(self, payload, deadline, emit):
+        payload = dict(payload, stream=True)
+        return asyncio.run_coroutine_threadsafe(self._stream(payload, deadline or self.deadline, emit), self._loop)
+
+    @staticmethod
+    def _content(result):
+        return result["choices"][0]["message"]["content"]
+
+    async def chat(self, messages, model, deadline=None, **params):
+        """
+        异步调用 chat/completions 接口，可以在任意事件循环中使用
+
+        Args:
+            messages: 对话消息列表
+            model (str): 模型名称
+            deadline (float, optional): 本次调用（包括重试）的总时限（秒）
+            **params: 采样参数（temperature 等）
+
+        Returns:
+            str: 回答内容
+        """
+        payload = dict(params, model=model, messages=messages)
+        return self._content(await asyncio.wrap_future(self._submit(payload, deadline)))
+
+    def chat_sync(self, messages, model, deadline=None, **params):
+        """chat 的同步版本，供现有的同步代码使用"""
+        payload = dict(params, model=model, messages=messages)
+        return self._content(self._submit(payload, deadline).result())
+
+    def chat_many_sync(self, messages_list, model, deadline=None, **params):
+        """
+        并发发送多个请求（同时进行中的请求数仍受 max_concurrency 限制），等待全部完成
+
+        Args:
+            messages_list: 每个请求的对话消息列表
+            model (str): 模型名称
+            deadline (float, optional): 每个请求（包括重试）的总时限（秒）
+            **params: 采样参数（temperature 等）
+
+        Returns:
+            list: 与 messages_list 顺序一致的回答内容，失败的请求为对应的异常对象
+        """
+        futures = [self._submit(dict(params, model=model, messages=messages), deadline)
+                   for messages in messages_list]
+        results = []
+        for future in futures:
+            try:
+                results.append(self._content(future.result()))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def chat_stream(self, messages, model, deadline=None, **params):
+        """
+        流式调用 chat/completions 接口，逐段返回回答内容（异步生成器）
+
+        Args:
+            messages: 对话消息列表
+            model (str): 模型名称
+            deadline (float, optional): 本次调用（包括重试）的总时限（秒）
+            **params: 采样参数（temperature 等）
+
+        Yields:
+            str: 新收到的一段回答
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        payload = dict(params, model=model, messages=messages)
+        future = self._submit_stream(payload, deadline,
+                                     lambda delta: loop.call_soon_threadsafe(chunks.put_nowait, delta))
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(chunks.put_nowait, None))
+        while True:
+            delta = await chunks.get()
+            if delta is None:
+                break
+            yield delta
+        await asyncio.wrap_future(future)
+
+    def chat_stream_sync(self, messages, model, deadline=None, **params):
+        """chat_stream 的同步版本（生成器）"""
+        chunks = queue.Queue()
+        payload = dict(params, model=model, messages=messages)
+        future = self._submit_stream(payload, deadline, chunks.put)
+        future.add_done_callback(lambda _: chunks.put(None))
+        while True:
+            delta = chunks.get()
+            if delta is None:
+                break
+            yield delta
+        future.result()
+
+    def close(self):
+        """关闭连接池并停止事件循环线程"""
+        if not self._loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def get_llm_client(api_url, api_key, **options):
+    """
+    获取进程内共享的客户端，相同地址、密钥和参数只创建一次
+
+    Args:
+        api_url (str): chat/completions 接口地址
+        api_key (str): API密钥
+        **options: LLMClient 的其他参数
+
+    Returns:
+        LLMClient
+    """
+    key = (api_url, api_key, tuple(sorted(options.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = LLMClient(api_url, api_key, **options)
+                _clients[key] = client
+    return client
+
+
+def close_llm_clients():
+    """关闭所有共享的客户端（服务停止时调用）"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,230 @@
+import json
+import time
+import random
+import argparse
+import threading
+import httpx
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tools.llm_cache import LLMCache
+from tools.po_fields import PO_COLUMNS, extract_po_fields, clean_ocr_text
+from tools.prompt_compact import estimate_tokens
+
+# 工作模式：synthetic 用规则提取生成回答；record 转发到真实接口并保存回答；replay 只返回保存的回答
+MODE_SYNTHETIC = "synthetic"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+MODES = (MODE_SYNTHETIC, MODE_RECORD, MODE_REPLAY)
+
+# 提示词中PDF文本的开始标记，见 tools.po_prompt
+_CONTENT_MARK = "PDF文本内容：\n"
+# 流式返回时每个事件包含的字符数
+STREAM_CHUNK_CHARS = 16
+
+
+def request_key(payload):
+    """请求的hash，与大模型回答缓存使用同样的规则（空白字符不同的请求视为相同）"""
+    params = {key: value for key, value in payload.items() if key not in ("model", "messages", "stream")}
+    return LLMCache.make_key(payload.get("model"), payload.get("messages", []), params, None)
+
+
+def synthetic_answer(messages):
+    """
+    不调用大模型，按提示词类型生成格式正确的回答
+
+    表格提取的提示词返回规则提取的JSON结果，字段补全的提示词返回每个字段 “/”
+    """
+    prompt = messages[-1]["content"] if messages else ""
+    head, _, content = prompt.partition(_CONTENT_MARK)
+    if "字段名：值" in head:
+        columns = [line.rstrip("：") for line in head.splitlines() if line.rstrip("：") in PO_COLUMNS]
+        return "\n".join(f"{column}：/" for column in columns)
+    return extract_po_fields(clean_ocr_text(content)).to_json()
+
+
+class StubConfig:
+    """替身服务的配置"""
+
+    def __init__(self, mode=MODE_SYNTHETIC, latency=0.0, tokens_per_second=None, failure_rate=0.0,
+                 store=None, upstream_url=None, upstream_key=None, seed=None):
+        """
+        Args:
+            mode (str): synthetic / record / replay
+            latency (float): 开始返回前的等待时间（秒），模拟排队和首token延迟
+            tokens_per_second (float, optional): 生成速度，None表示不限速
+            failure_rate (float): 随机返回 503 的比例，用于测试重试
+            store (LLMCache, optional): 保存录制回答的缓存（record/replay 模式必需）
+            upstream_url (str, optional): record 模式转发的真实接口地址
+            upstream_key (str, optional): 真实接口的API密钥
+            seed (int, optional): 随机失败的种子，固定后结果可复现
+        """
+        if mode not in MODES:
+            raise ValueError(f"未知的模式: {mode}，可选 {MODES}")
+        if mode != MODE_SYNTHETIC and store is None:
+            raise ValueError(f"{mode} 模式需要指定录制文件")
+        if mode == MODE_RECORD and not upstream_url:
+            raise ValueError("record 模式需要指定真实接口地址")
+        self.mode = mode
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.store = store
+        self.upstream_url = upstream_url
+        self.upstream_key = upstream_key
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "failures": 0, "replayed": 0, "recorded": 0, "missing": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.config.lock:
+                self._send_json(200, dict(self.config.stats))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        config = self.config
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        config.count("requests")
+        if config.latency:
+            time.sleep(config.latency)
+        if config.should_fail():
+            config.count("failures")
+            self._send_json(503, {"error": "模拟的服务端错误"})
+            return
+
+        try:
+            answer = self._answer(payload)
+        except httpx.HTTPError as e:
+            self._send_json(502, {"error": f"真实接口调用失败: {e}"})
+            return
+        if answer is None:
+            config.count("missing")
+            self._send_json(404, {"error": "没有录制该请求的回答"})
+            return
+        if payload.get("stream"):
+            self._stream(answer)
+            return
+        if config.tokens_per_second:
+            time.sleep(estimate_tokens(answer) / config.tokens_per_second)
+        self._send_json(200, {
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                         "finish_reason": "stop"}],
+        })
+
+    def _answer(self, payload):
+        """按模式得到回答，replay 模式没有录制时返回 None"""
+        config = self.config
+        if config.mode == MODE_SYNTHETIC:
+            return synthetic_answer(payload.get("messages", []))
+        key = request_key(payload)
+        answer = config.store.get(key)
+        if answer is not None:
+            config.count("replayed")
+            return answer
+        if config.mode == MODE_REPLAY:
+            return None
+        upstream = dict(payload, stream=False)
+        response = httpx.post(config.upstream_url, json=upstream, timeout=300,
+                              headers={"Authorization": f"Bearer {config.upstream_key}"})
+        response.raise_for_status()
+        answer = response.json()["choices"][0]["message"]["content"]
+        config.store.put(key, answer)
+        config.count("recorded")
+        return answer
+
+    def _stream(self, answer):
+        """按 chat/completions 的 SSE 格式分段返回"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(answer), STREAM_CHUNK_CHARS):
+            delta = answer[start:start + STREAM_CHUNK_CHARS]
+            if self.config.tokens_per_second:
+                time.sleep(estimate_tokens(delta) / self.config.tokens_per_second)
+            self._write_chunk("data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": delta}}]},
+                                                    ensure_ascii=False) + "\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def start_stub_server(config, host="127.0.0.1", port=0):
+    """
+    在后台线程中启动替身服务
+
+    Args:
+        config (StubConfig): 服务配置
+        host (str): 监听地址
+        port (int): 监听端口，0表示随机选择空闲端口
+
+    Returns:
+        tuple: (server, chat/completions 接口地址)，用完后调用 server.shutdown()
+    """
+    handler = type("StubHandler", (_Handler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/v1/chat/completions"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI兼容的大模型替身服务，用于离线测试和性能测试")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--mode", choices=MODES, default=MODE_SYNTHETIC)
+    parser.add_argument("--latency", type=float, default=0.0, help="开始返回前的等待时间（秒）")
+    parser.add_argument("--tps", type=float, default=None, help="生成速度（token/秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="随机返回503的比例")
+    parser.add_argument("--store", default=None, help="录制回答的文件（record/replay 模式）")
+    parser.add_argument("--upstream-url", default=None, help="record 模式转发的真实接口地址")
+    parser.add_argument("--upstream-key", default=None, help="真实接口的API密钥")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    store = LLMCache(args.store, ttl=None, max_bytes=2 ** 62) if args.store else None
+    config = StubConfig(args.mode, args.latency, args.tps, args.failure_rate, store,
+                        args.upstream_url, args.upstream_key, args.seed)
+    server, url = start_stub_server(config, args.host, args.port)
+    print(f"大模型替身服务已启动（{args.mode}）: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import re
+import pandas as pd
+
+# 未转义的列分隔符（"\|" 是单元格内容中的竖线）
+_CELL_SPLIT = re.compile(r"(?<!\\)\|")
+# 表头下面的分隔行，例如 |---|:---:|
+_SEPARATOR_CELL = re.compile(r"^\s*:?-{3,}:?\s*$")
+# 代码块标记，例如 ```markdown
+_FENCE = re.compile(r"^\s*```")
+
+
+def _split_row(line):
+    """按未转义的竖线拆分一行，去掉首尾的边框"""
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in _CELL_SPLIT.split(line)]
+
+
+def _unique_columns(header):
+    """重复的列名加后缀 .1、.2（与 pandas 读取Excel时的规则一致），空列名记为 列N"""
+    columns = []
+    seen = {}
+    for index, name in enumerate(header):
+        name = name or f"列{index + 1}"
+        if name in seen:
+            seen[name] += 1
+            columns.append(f"{name}.{seen[name]}")
+        else:
+            seen[name] = 0
+            columns.append(name)
+    return columns
+
+
+def parse_markdown_table(content):
+    """
+    解析Markdown表格（取内容中的第一张表格）
+
+    表格前后的说明文字和代码块标记会被跳过；单元格中的 "\\|" 还原为竖线；
+    重复的列名加 .1、.2 后缀；列数与表头不一致的行不写入结果，原因记录在返回值中
+
+    Args:
+        content (str): 包含Markdown表格的文本
+
+    Returns:
+        tuple: (DataFrame, rejected)，rejected 为 [{"line": 行号(从1开始), "text": 原文, "reason": 原因}, ...]
+    """
+    header = None
+    rows = []
+    rejected = []
+    for line_no, line in enumerate(content.splitlines(), 1):
+        if not line.strip() or _FENCE.match(line):
+            if header is not None and rows:
+                break
+            continue
+        if not _CELL_SPLIT.search(line):
+            # 表格之前的说明文字跳过，表格之后的内容不再解析
+            if header is not None:
+                break
+            continue
+        cells = _split_row(line)
+        if header is None:
+            header = cells
+        elif all(_SEPARATOR_CELL.match(cell) for cell in cells):
+            continue
+        elif len(cells) != len(header):
+            rejected.append({"line": line_no, "text": line,
+                             "reason": f"列数 {len(cells)} 与表头列数 {len(header)} 不一致"})
+        elif not any(cells):
+            rejected.append({"line": line_no, "text": line, "reason": "空行"})
+        else:
+            rows.append(cells)
+
+    if header is None:
+        return pd.DataFrame(), rejected
+    columns = _unique_columns(header)
+    # 一次转置为按列存储，直接构建DataFrame
+    data = list(zip(*rows)) if rows else [()] * len(columns)
+    return pd.DataFrame(dict(zip(columns, data)), columns=columns), rejected
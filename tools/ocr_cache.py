@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from tools.ocr_store import OCRDocument
+
+# 缓存格式版本，识别结果的格式变化时递增，旧缓存自动失效
+CACHE_VERSION = 6
+
+
+def page_fingerprint(page):
+    """
+    计算PDF页面内容的哈希值
+
+    包括页面内容流、页面尺寸和旋转、引用的图片数据和字体定义，
+    同一页面出现在不同文件或不同页码时哈希值相同
+
+    Args:
+        page: fitz.Page 对象
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    doc = page.parent
+    digest = hashlib.sha256()
+    digest.update(f"{tuple(page.rect)}|{page.rotation}".encode("utf-8"))
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    for font in page.get_fonts(full=True):
+        digest.update(doc.xref_object(font[0], compressed=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    基于内容哈希的页面识别结果磁盘缓存
+
+    缓存key由页面内容哈希和渲染、预处理、OCR参数共同决定；
+    总大小超过上限时按最近使用时间（LRU）淘汰
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_bytes (int): 缓存总大小上限（字节）
+        """
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> 文件大小，按最近使用时间从旧到新排列
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """扫描缓存目录，按文件修改时间重建LRU顺序"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(".") or not name.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def make_key(self, page, params):
+        """
+        计算页面的缓存key
+
+        Args:
+            page: fitz.Page 对象
+            params (dict): 渲染、预处理和OCR参数
+
+        Returns:
+            str: 缓存key
+        """
+        digest = hashlib.sha256()
+        digest.update(page_fingerprint(page).encode("utf-8"))
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(str(CACHE_VERSION).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        读取缓存的页面识别结果
+
+        Args:
+            key (str): 缓存key
+
+        Returns:
+            PageResult: 命中时返回识别结果，否则返回 None
+        """
+        path = self._path(key)
+        try:
+            page_result = OCRDocument.load(path).page(0)
+            # 更新修改时间，保证重启后LRU顺序仍然正确
+            os.utime(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            with self._lock:
+                self.misses += 1
+                self._forget(key)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # 其他进程写入的缓存
+                size = os.path.getsize(path)
+                self._entries[key] = size
+                self._total_bytes += size
+        page_result.timings = {"cache": page_result.timings.get("total", 0)}
+        return page_result
+
+    def put(self, key, page_result):
+        """
+        写入页面识别结果，必要时淘汰最久未使用的缓存
+
+        Args:
+            key (str): 缓存key
+            page_result (PageResult): 页面识别结果
+        """
+        path = self._path(key)
+        # 先写临时文件再替换，避免多个进程同时读写时读到不完整的文件
+        tmp_path = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp.npz")
+        OCRDocument.from_pages([page_result]).save(tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """淘汰最久未使用的缓存，直到总大小不超过上限"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,98 @@
+import threading
+from paddleocr import PaddleOCR
+
+# 默认的OCR模型配置（中文模型 + 方向分类器）
+DEFAULT_OCR_CONFIG = {
+    "use_angle_cls": True,
+    "lang": "ch",
+    "use_gpu": True,
+}
+
+# 进程内的OCR引擎注册表: 配置key -> PaddleOCR实例
+_engines = {}
+# 每个引擎的推理锁: 配置key -> Lock，PaddleOCR的推理不是线程安全的
+_inference_locks = {}
+_engines_lock = threading.Lock()
+
+
+def _config_key(config):
+    """将配置字典转换为可哈希的key"""
+    return tuple(sorted(config.items()))
+
+
+def resolve_ocr_config(**overrides):
+    """
+    合并默认配置和自定义配置
+
+    Args:
+        **overrides: 需要覆盖的PaddleOCR参数
+
+    Returns:
+        dict: 完整的OCR配置
+    """
+    config = dict(DEFAULT_OCR_CONFIG)
+    config.update(overrides)
+    return config
+
+
+def get_ocr_engine(**overrides):
+    """
+    获取共享的PaddleOCR引擎，每种配置在一个进程内只加载一次模型
+
+    Args:
+        **overrides: 需要覆盖的PaddleOCR参数，例如 lang="en"
+
+    Returns:
+        PaddleOCR: 已加载的OCR引擎
+    """
+    config = resolve_ocr_config(**overrides)
+    key = _config_key(config)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        # 双重检查，避免并发时重复加载模型
+        engine = _engines.get(key)
+        if engine is None:
+            engine = PaddleOCR(**config)
+            _engines[key] = engine
+            _inference_locks[key] = threading.Lock()
+    return engine
+
+
+def get_engine_lock(**overrides):
+    """
+    获取共享引擎的推理锁，多个线程使用同一个引擎识别时需要持有该锁
+
+    Args:
+        **overrides: 与 get_ocr_engine 相同的覆盖参数
+
+    Returns:
+        threading.Lock
+    """
+    key = _config_key(resolve_ocr_config(**overrides))
+    with _engines_lock:
+        return _inference_locks.setdefault(key, threading.Lock())
+
+
+def prewarm_ocr_engines(configs=None):
+    """
+    预加载OCR引擎，一般在服务启动时调用
+
+    Args:
+        configs: 配置列表（每项为覆盖参数字典），默认只预加载默认配置
+
+    Returns:
+        int: 已加载的引擎数量
+    """
+    for overrides in configs or [{}]:
+        get_ocr_engine(**overrides)
+    return len(_engines)
+
+
+def clear_ocr_engines():
+    """释放所有已加载的OCR引擎"""
+    with _engines_lock:
+        _engines.clear()
+        _inference_locks.clear()
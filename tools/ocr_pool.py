@@ -0,0 +1,203 @@
+import os
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+from tools.ocr_engine import get_ocr_engine
+from tools.page_ocr import ocr_pdf_page, DEFAULT_OCR_OPTIONS
+
+# 每个工作进程默认使用的推理线程数
+DEFAULT_THREADS_PER_WORKER = 2
+# 各类数学库的线程数环境变量（libgomp等只在加载时读取一次）
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# 临时修改环境变量时持有的锁
+_environ_lock = threading.Lock()
+
+# 工作进程内的OCR引擎（由 _init_worker 创建）
+_worker_engine = None
+
+# 进程内共享的页面工作池: (workers, threads_per_worker, 配置key) -> PageOCRPool
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _init_worker(ocr_config, threads_per_worker):
+    """工作进程初始化：限制OpenCV线程数并加载该进程自己的OCR引擎"""
+    global _worker_engine
+    # 数学库的线程数由父进程在启动工作进程前通过环境变量设置（见 _thread_limits），
+    # 到这里时paddle已经随模块导入加载，再设置环境变量不会生效
+    import cv2
+    cv2.setNumThreads(1)
+
+    config = dict(ocr_config)
+    config.setdefault("cpu_threads", threads_per_worker)
+    _worker_engine = get_ocr_engine(**config)
+
+
+@contextlib.contextmanager
+def _thread_limits(threads_per_worker):
+    """
+    临时设置线程数环境变量，期间启动的工作进程继承这些变量
+
+    spawn 启动的工作进程在导入本模块（以及主模块）时就会加载paddle，必须在启动前设置；
+    ProcessPoolExecutor 在 submit 时按需启动工作进程，因此提交任务时需要在该上下文中
+    """
+    with _environ_lock:
+        saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+        os.environ.update({name: str(threads_per_worker) for name in THREAD_ENV_VARS})
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def _ocr_page_task(pdf_path, page_index, options, matched=False, template=None):
+    """在工作进程中渲染并识别单个页面，matched 为 True 时沿用文件已匹配的版面模板 template（名称）"""
+    doc = fitz.open(pdf_path)
+    try:
+        match = options.templates.carry(template) if matched and options.templates else None
+        return ocr_pdf_page(_worker_engine, doc[page_index], options, match)
+    finally:
+        doc.close()
+
+
+def default_worker_count(threads_per_worker=DEFAULT_THREADS_PER_WORKER):
+    """根据CPU核数和每个进程的线程数计算默认进程数"""
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_worker))
+
+
+def plan_workers(workers=None, threads_per_worker=DEFAULT_THREADS_PER_WORKER):
+    """
+    确定工作进程数和每个进程的线程数，保证 进程数 × 线程数 不超过CPU核数
+
+    指定的进程数超过CPU核数时减少到CPU核数，再按进程数减少每个进程的线程数
+
+    Args:
+        workers (int, optional): 工作进程数，默认按CPU核数计算
+        threads_per_worker (int): 每个工作进程的推理线程数
+
+    Returns:
+        tuple: (进程数, 每个进程的线程数)
+    """
+    cpus = os.cpu_count() or 1
+    threads_per_worker = min(max(1, threads_per_worker), cpus)
+    workers = min(workers, cpus) if workers else default_worker_count(threads_per_worker)
+    return workers, max(1, min(threads_per_worker, cpus // workers))
+
+
+class PageOCRPool:
+    """多进程页面OCR工作池，每个工作进程持有自己的OCR引擎"""
+
+    def __init__(self, workers=None, threads_per_worker=DEFAULT_THREADS_PER_WORKER, ocr_config=None):
+        """
+        Args:
+            workers (int, optional): 工作进程数，默认按CPU核数计算
+            threads_per_worker (int): 每个工作进程的推理线程数
+            ocr_config (dict, optional): 覆盖默认PaddleOCR配置的参数
+        """
+        self.workers, self.threads_per_worker = plan_workers(workers, threads_per_worker)
+        if workers and (self.workers, self.threads_per_worker) != (workers, threads_per_worker):
+            print(f"页面工作池: {workers} 个进程 × {threads_per_worker} 个线程超过CPU核数，"
+                  f"调整为 {self.workers} × {self.threads_per_worker}")
+        self.ocr_config = dict(ocr_config or {})
+        # PaddleOCR不支持fork后继续使用，使用spawn方式启动工作进程
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.ocr_config, self.threads_per_worker),
+        )
+
+    def iter_pages(self, pdf_path, page_indices, options=DEFAULT_OCR_OPTIONS):
+        """
+        并行识别PDF的指定页面，按给定顺序逐页返回结果
+
+        所有页面同时提交给工作池，前面的页面识别完成后立即返回，不必等待后面的页面；
+        配置了版面模板时先识别第一页，其余页面沿用第一页（扫描页）匹配到的模板，不再逐页匹配
+
+        Args:
+            pdf_path: PDF文件路径
+            page_indices: 需要识别的页面下标（从0开始）
+            options (OCROptions): 识别参数
+
+        Yields:
+            PageResult: 单页识别结果
+        """
+        pdf_path = str(pdf_path)
+        page_indices = list(page_indices)
+        futures = []
+        try:
+            carried = ()
+            if options.templates and len(page_indices) > 1:
+                # 先识别第一页确定模板，第一页不是扫描页时其余页面各自匹配
+                with _thread_limits(self.threads_per_worker):
+                    futures.append(self._executor.submit(_ocr_page_task, pdf_path, page_indices.pop(0), options))
+                first = futures[0].result()
+                carried = (first.source == "ocr", first.template)
+            # 工作进程在 submit 时启动，启动前设置好线程数环境变量
+            with _thread_limits(self.threads_per_worker):
+                futures.extend(
+                    self._executor.submit(_ocr_page_task, pdf_path, page_index, options, *carried)
+                    for page_index in page_indices
+                )
+            # 按提交顺序取结果，保证页面顺序
+            for future in futures:
+                yield future.result()
+        finally:
+            # 调用方提前停止迭代时取消尚未开始的页面
+            for future in futures:
+                future.cancel()
+
+    def ocr_pages(self, pdf_path, page_count, options=DEFAULT_OCR_OPTIONS):
+        """
+        并行识别PDF的所有页面
+
+        Returns:
+            list: 每页的 PageResult，按页码顺序排列
+        """
+        return list(self.iter_pages(pdf_path, range(page_count), options))
+
+    def close(self):
+        """关闭工作池"""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def get_page_pool(workers=None, threads_per_worker=DEFAULT_THREADS_PER_WORKER, ocr_config=None):
+    """
+    获取共享的页面工作池，相同参数在一个进程内只创建一次
+
+    Args:
+        workers (int, optional): 工作进程数
+        threads_per_worker (int): 每个工作进程的推理线程数
+        ocr_config (dict, optional): 覆盖默认PaddleOCR配置的参数
+
+    Returns:
+        PageOCRPool: 页面工作池
+    """
+    key = (plan_workers(workers, threads_per_worker), tuple(sorted((ocr_config or {}).items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = PageOCRPool(workers, threads_per_worker, ocr_config)
+            _pools[key] = pool
+    return pool
+
+
+def shutdown_page_pools():
+    """关闭所有共享的页面工作池"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
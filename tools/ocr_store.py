@@ -0,0 +1,213 @@
+import numpy as np
+from tools.page_ocr import PageResult
+from tools.table_grid import TableGrid
+
+# 文本来源编码
+SOURCE_CODES = {"ocr": 0, "text_layer": 1}
+SOURCE_NAMES = {code: name for name, code in SOURCE_CODES.items()}
+
+
+class OCRDocument:
+    """
+    一份PDF的识别结果的紧凑存储
+
+    所有页面的文本框、置信度保存在NumPy数组中，文本保存在一个字符串缓冲区中并用偏移量索引，
+    避免为每一行创建嵌套的Python列表和元组
+    """
+
+    def __init__(self, boxes, scores, line_pages, text, offsets, page_nums, page_dpis,
+                 page_sources, page_seconds, page_cls_skipped=None, names="", line_labels=None,
+                 page_templates=None, table_pages=None, table_sizes=None, table_coords=None):
+        self.boxes = boxes                  # (N, 4, 2) float32 每行的四点坐标（pt）
+        self.scores = scores                # (N,) float32 每行的置信度
+        self.line_pages = line_pages        # (N,) int32 每行所在页面的下标
+        self.text = text                    # 所有行文本拼接成的字符串
+        self.offsets = offsets              # (N+1,) int64 每行文本在缓冲区中的起止位置
+        self.page_nums = page_nums          # (P,) int32 页码
+        self.page_dpis = page_dpis          # (P,) int16 渲染DPI，未渲染为0
+        self.page_sources = page_sources    # (P,) uint8 文本来源编码
+        self.page_seconds = page_seconds    # (P,) float32 每页耗时（秒）
+        # (P,) int32 每页跳过方向分类器的行数
+        self.page_cls_skipped = (page_cls_skipped if page_cls_skipped is not None
+                                 else np.zeros(len(page_nums), dtype=np.int32))
+        # 模板名称和区域名称表，以换行分隔
+        self.names = names
+        self._name_list = names.split("\n") if names else []
+        # (N,) int16 每行所属模板区域在名称表中的下标，-1表示没有
+        self.line_labels = (line_labels if line_labels is not None
+                            else np.full(len(scores), -1, dtype=np.int16))
+        # (P,) int16 每页匹配的模板在名称表中的下标，-1表示没有
+        self.page_templates = (page_templates if page_templates is not None
+                               else np.full(len(page_nums), -1, dtype=np.int16))
+        # (T,) int32 每张表格所在页面的下标；(T, 2) int32 每张表格的列线、行线条数；
+        # 所有表格的列线x坐标、行线y坐标依次拼接成的 float32 数组
+        self.table_pages = table_pages if table_pages is not None else np.zeros(0, dtype=np.int32)
+        self.table_sizes = table_sizes if table_sizes is not None else np.zeros((0, 2), dtype=np.int32)
+        self.table_coords = table_coords if table_coords is not None else np.zeros(0, dtype=np.float32)
+        self._table_offsets = np.concatenate(([0], np.cumsum(self.table_sizes.sum(axis=1))))
+
+    @classmethod
+    def from_pages(cls, page_results):
+        """
+        由逐页识别结果构建
+
+        Args:
+            page_results: PageResult 列表
+
+        Returns:
+            OCRDocument
+        """
+        page_results = list(page_results)
+        lines = [line for page in page_results for line in page.lines]
+        line_count = len(lines)
+
+        boxes = np.zeros((line_count, 4, 2), dtype=np.float32)
+        scores = np.zeros(line_count, dtype=np.float32)
+        line_pages = np.zeros(line_count, dtype=np.int32)
+        start = 0
+        for page_index, page in enumerate(page_results):
+            end = start + len(page.lines)
+            if end > start:
+                boxes[start:end] = page.boxes
+                scores[start:end] = page.scores
+                line_pages[start:end] = page_index
+            start = end
+
+        offsets = np.zeros(line_count + 1, dtype=np.int64)
+        np.cumsum([len(line) for line in lines], out=offsets[1:])
+
+        name_index = {}
+        def name_code(name):
+            if not name:
+                return -1
+            return name_index.setdefault(name, len(name_index))
+        line_labels = np.array([name_code(label) for page in page_results
+                                for label in (page.labels or [None] * len(page.lines))], dtype=np.int16)
+        page_templates = np.array([name_code(page.template) for page in page_results], dtype=np.int16)
+
+        tables = [(page_index, table) for page_index, page in enumerate(page_results) for table in page.tables]
+        table_coords = [value for _, table in tables for value in table.xs + table.ys]
+
+        return cls(
+            boxes=boxes,
+            scores=scores,
+            line_pages=line_pages,
+            text="".join(lines),
+            offsets=offsets,
+            page_nums=np.array([page.page_num for page in page_results], dtype=np.int32),
+            page_dpis=np.array([page.dpi or 0 for page in page_results], dtype=np.int16),
+            page_sources=np.array([SOURCE_CODES[page.source] for page in page_results], dtype=np.uint8),
+            page_seconds=np.array([page.timings.get("total", 0) for page in page_results], dtype=np.float32),
+            page_cls_skipped=np.array([page.cls_skipped for page in page_results], dtype=np.int32),
+            names="\n".join(name_index),
+            line_labels=line_labels,
+            page_templates=page_templates,
+            table_pages=np.array([page_index for page_index, _ in tables], dtype=np.int32),
+            table_sizes=np.array([(len(table.xs), len(table.ys)) for _, table in tables],
+                                 dtype=np.int32).reshape(-1, 2),
+            table_coords=np.array(table_coords, dtype=np.float32),
+        )
+
+    def __len__(self):
+        return len(self.scores)
+
+    @property
+    def page_count(self):
+        return len(self.page_nums)
+
+    def line(self, index):
+        """第 index 行的文本"""
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def _name(self, code):
+        return self._name_list[code] if code >= 0 else None
+
+    def page_tables(self, page_index):
+        """第 page_index 页（从0开始）的表格网格"""
+        tables = []
+        for table_index in np.flatnonzero(self.table_pages == page_index):
+            start = self._table_offsets[table_index]
+            col_count, row_count = self.table_sizes[table_index]
+            coords = self.table_coords[start:start + col_count + row_count].tolist()
+            tables.append(TableGrid(coords[:col_count], coords[col_count:]))
+        return tables
+
+    def page_lines(self, page_index):
+        """第 page_index 页（从0开始）所有行的下标"""
+        return np.flatnonzero(self.line_pages == page_index)
+
+    def page(self, page_index):
+        """
+        还原单页的识别结果
+
+        Args:
+            page_index (int): 页面下标（从0开始）
+
+        Returns:
+            PageResult
+        """
+        indices = self.page_lines(page_index)
+        dpi = int(self.page_dpis[page_index])
+        template = self._name(int(self.page_templates[page_index]))
+        return PageResult(
+            page_num=int(self.page_nums[page_index]),
+            lines=[self.line(i) for i in indices],
+            boxes=self.boxes[indices].tolist(),
+            scores=self.scores[indices].tolist(),
+            source=SOURCE_NAMES[int(self.page_sources[page_index])],
+            dpi=dpi or None,
+            timings={"total": float(self.page_seconds[page_index])},
+            cls_skipped=int(self.page_cls_skipped[page_index]),
+            template=template,
+            labels=[self._name(int(code)) for code in self.line_labels[indices]] if template else None,
+            tables=self.page_tables(page_index),
+        )
+
+    def pages(self):
+        """还原所有页面的识别结果"""
+        return [self.page(page_index) for page_index in range(self.page_count)]
+
+    def save(self, path):
+        """
+        保存为单个 .npz 文件
+
+        Args:
+            path: 保存路径
+        """
+        np.savez_compressed(
+            path,
+            boxes=self.boxes,
+            scores=self.scores,
+            line_pages=self.line_pages,
+            text=np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8),
+            offsets=self.offsets,
+            page_nums=self.page_nums,
+            page_dpis=self.page_dpis,
+            page_sources=self.page_sources,
+            page_seconds=self.page_seconds,
+            page_cls_skipped=self.page_cls_skipped,
+            names=np.frombuffer(self.names.encode("utf-8"), dtype=np.uint8),
+            line_labels=self.line_labels,
+            page_templates=self.page_templates,
+            table_pages=self.table_pages,
+            table_sizes=self.table_sizes,
+            table_coords=self.table_coords,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        从 .npz 文件加载
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            OCRDocument
+        """
+        with np.load(path) as data:
+            fields = {name: data[name] for name in data.files}
+        fields["text"] = fields["text"].tobytes().decode("utf-8")
+        if "names" in fields:
+            fields["names"] = fields["names"].tobytes().decode("utf-8")
+        return cls(**fields)
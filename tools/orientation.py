@@ -0,0 +1,88 @@
+import fitz  # PyMuPDF
+import cv2
+import numpy as np
+
+# 方向判断模式
+ORIENTATION_AUTO = "auto"        # 快速探测横排，再抽样确认不是倒置的，无法确定时才运行方向分类器
+ORIENTATION_UPRIGHT = "upright"  # 已知页面是正向的，始终跳过方向分类器
+ORIENTATION_CLS = "cls"          # 始终运行方向分类器
+
+# 探测渲染分辨率
+PROBE_DPI = 50
+# 行投影方差 / 列投影方差 超过该值时认为文字是横排的
+MIN_PROFILE_RATIO = 2.0
+# 抽样确认方向时送入方向分类器的文本行数
+CLS_SAMPLE_LINES = 5
+# 抽样的文本行判为0度的最低置信度
+MIN_CLS_SCORE = 0.9
+
+
+def is_upright(page, clip=None, probe_dpi=PROBE_DPI, min_ratio=MIN_PROFILE_RATIO):
+    """
+    用低分辨率投影探测判断页面（或区域）的文字是否为横排
+
+    横排文字的行投影呈现明显的“文字行/行间距”交替，方差远大于列投影；
+    渲染时已经按页面的 /Rotate 旋转，探测的是显示方向。
+    投影无法区分0度和180度（倒置的页面同样是横排），需要再用 sample_upright 确认
+
+    Args:
+        page: fitz.Page 对象
+        clip (fitz.Rect, optional): 只判断指定区域
+        probe_dpi (int): 探测渲染分辨率
+        min_ratio (float): 判定为横排的最小投影方差比
+
+    Returns:
+        bool: 确定为横排时返回 True，无法确定时返回 False
+    """
+    scale = probe_dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    row_var = binary.mean(axis=1).var()
+    col_var = binary.mean(axis=0).var()
+    if row_var == 0:
+        return False
+    return bool(col_var == 0 or row_var / col_var >= min_ratio)
+
+
+def needs_cls(page, clip=None, orientation=ORIENTATION_AUTO):
+    """
+    判断识别页面（或区域）时是否需要运行方向分类器
+
+    auto 模式下返回 False 只说明文字是横排的，识别后还需要用 sample_upright 抽样确认不是倒置的
+
+    Args:
+        page: fitz.Page 对象
+        clip (fitz.Rect, optional): 识别的区域
+        orientation (str): 方向判断模式，auto / upright / cls
+
+    Returns:
+        bool: 是否需要运行方向分类器
+    """
+    if orientation == ORIENTATION_UPRIGHT:
+        return False
+    if orientation == ORIENTATION_CLS:
+        return True
+    return not is_upright(page, clip)
+
+
+def sample_upright(engine, crops, samples=CLS_SAMPLE_LINES, min_score=MIN_CLS_SCORE):
+    """
+    对少量文本行运行方向分类器，确认页面（或区域）不是倒置的
+
+    从文本行中均匀抽取 samples 行，全部以足够的置信度判为0度时认为其余文本行也是正向的
+
+    Args:
+        engine: PaddleOCR引擎
+        crops: 裁剪出的文本行图片列表
+        samples (int): 抽样的行数
+        min_score (float): 判为0度的最低置信度
+
+    Returns:
+        bool: 抽样的文本行都是正向时返回 True；引擎没有启用方向分类器时无法确认，也返回 True
+    """
+    if not crops or not getattr(engine, "use_angle_cls", False):
+        return True
+    step = max(1, len(crops) // samples)
+    _, results, _ = engine.text_classifier(list(crops[::step][:samples]))
+    return all(label == "0" and score >= min_score for label, score in results)
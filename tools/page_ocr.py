@@ -0,0 +1,528 @@
+import time
+import fitz  # PyMuPDF
+import cv2
+import numpy as np
+from tools.render_policy import DEFAULT_RESOLUTION_POLICY
+from tools.orientation import needs_cls, sample_upright, ORIENTATION_AUTO
+from tools.table_grid import detect_table_grids, grids_to_page, grids_from_drawings, layout_with_tables
+
+# 固定渲染时的默认分辨率
+DEFAULT_DPI = 300
+
+# 文本层可用的最少字符数
+MIN_TEXT_LAYER_CHARS = 20
+# 文本层中乱码字符（替换符、私有区字符）的最大占比
+MAX_BAD_CHAR_RATIO = 0.1
+# 需要单独OCR的图片区域占页面面积的最小比例
+MIN_IMAGE_AREA_RATIO = 0.05
+# 图片覆盖页面面积达到该比例时视为扫描页（文本层是OCR软件叠加的，不可靠）
+SCAN_IMAGE_AREA_RATIO = 0.9
+# 文本渲染模式 3：不可见文本（ocrmypdf 等工具叠加在扫描图片上的文本层）
+_INVISIBLE_TEXT = 3
+
+
+def render_page(page, dpi=DEFAULT_DPI, clip=None):
+    """
+    将PDF页面直接渲染为灰度图
+
+    返回的图片是 pixmap 像素缓冲区上的NumPy视图，不做额外拷贝；
+    使用图片期间需要保持 pixmap 对象存活
+
+    Args:
+        page: fitz.Page 对象
+        dpi (int): 渲染分辨率
+        clip (fitz.Rect, optional): 只渲染页面中的指定区域
+
+    Returns:
+        tuple: (fitz.Pixmap, 灰度图 np.ndarray)
+    """
+    pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72), clip=clip,
+                          colorspace=fitz.csGRAY, alpha=False)
+    # 旧版本PyMuPDF没有 samples_mv，退回到拷贝一次的 samples
+    samples = getattr(pix, "samples_mv", None) or pix.samples
+    gray = np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return pix, gray
+
+
+def _otsu_stage(image):
+    """Otsu二值化，图片可写时直接在原缓冲区上处理"""
+    dst = image if image.flags.writeable else None
+    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)[1]
+
+
+def _adaptive_stage(image):
+    """自适应阈值二值化，适合光照不均的扫描件"""
+    return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+def _median_stage(image):
+    """中值滤波去除椒盐噪点"""
+    return cv2.medianBlur(image, 3)
+
+
+# 可用的预处理步骤: 名称 -> 处理函数（输入输出均为单通道灰度图）
+PREPROCESS_STAGES = {
+    "otsu": _otsu_stage,
+    "adaptive": _adaptive_stage,
+    "median": _median_stage,
+}
+
+# 默认预处理步骤：Otsu二值化
+DEFAULT_PREPROCESS = ("otsu",)
+
+
+def register_preprocess_stage(name, func):
+    """
+    注册自定义预处理步骤
+
+    Args:
+        name (str): 步骤名称（会参与OCR缓存key的计算）
+        func: 处理函数，输入输出均为单通道灰度图
+    """
+    PREPROCESS_STAGES[name] = func
+
+
+def preprocess_image(gray, stages=DEFAULT_PREPROCESS):
+    """
+    按顺序执行预处理步骤
+
+    Args:
+        gray (np.ndarray): 灰度图
+        stages: 预处理步骤名称列表
+
+    Returns:
+        np.ndarray: 处理后的图片
+    """
+    for name in stages:
+        gray = PREPROCESS_STAGES[name](gray)
+    return gray
+
+
+def _is_bad_char(ch):
+    """判断是否为文本层中常见的乱码字符"""
+    code = ord(ch)
+    return ch == '\ufffd' or 0xE000 <= code <= 0xF8FF or (code < 32 and ch not in '\t\n\r')
+
+
+def _invisible_text_rects(page):
+    """页面中不可见文本（渲染模式3或透明度为0）的区域"""
+    rects = []
+    for span in page.get_texttrace():
+        if span["type"] == _INVISIBLE_TEXT or span.get("opacity", 1) == 0:
+            rects.append(fitz.Rect(span["bbox"]))
+    return rects
+
+
+def _is_scanned_page(page):
+    """页面被一张接近整页大小的图片覆盖时视为扫描页"""
+    page_area = abs(page.rect)
+    for info in page.get_image_info():
+        if abs(fitz.Rect(info["bbox"]) & page.rect) >= page_area * SCAN_IMAGE_AREA_RATIO:
+            return True
+    return False
+
+
+def extract_text_layer(page):
+    """
+    读取PDF页面自带的文本层
+
+    不可见的文本（扫描件上叠加的OCR文本层）不计入；文本位于整页大小的图片上时视为扫描页
+
+    Args:
+        page: fitz.Page 对象
+
+    Returns:
+        list: [(文本行, (x0, y0, x1, y1)), ...]，文本层不可用（扫描件、乱码）时返回 None
+    """
+    words = page.get_text("words", sort=True)
+    invisible = _invisible_text_rects(page) if words else []
+    if invisible:
+        # 单词的中心点落在不可见文本区域内时丢弃
+        words = [word for word in words
+                 if not any(rect.contains(fitz.Point((word[0] + word[2]) / 2, (word[1] + word[3]) / 2))
+                            for rect in invisible)]
+    chars = "".join(word[4] for word in words)
+    if len(chars) < MIN_TEXT_LAYER_CHARS:
+        return None
+    bad_chars = sum(1 for ch in chars if _is_bad_char(ch))
+    if bad_chars / len(chars) > MAX_BAD_CHAR_RATIO:
+        return None
+    if _is_scanned_page(page):
+        return None
+
+    # 按 (块号, 行号) 将单词合并为文本行
+    lines = []
+    current_key = None
+    for x0, y0, x1, y1, word, block_no, line_no, _ in words:
+        key = (block_no, line_no)
+        if key != current_key:
+            lines.append([word, [x0, y0, x1, y1]])
+            current_key = key
+        else:
+            line = lines[-1]
+            line[0] += " " + word
+            box = line[1]
+            box[0], box[1] = min(box[0], x0), min(box[1], y0)
+            box[2], box[3] = max(box[2], x1), max(box[3], y1)
+    return [(text, tuple(box)) for text, box in lines]
+
+
+def find_image_regions(page, text_boxes):
+    """
+    查找页面中没有文本层覆盖的大图片区域（例如扫描的印章、手写备注）
+
+    Args:
+        page: fitz.Page 对象
+        text_boxes: 文本层的文本框列表
+
+    Returns:
+        list: 需要OCR的 fitz.Rect 区域
+    """
+    page_area = abs(page.rect)
+    regions = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        if rect.is_empty or abs(rect) < page_area * MIN_IMAGE_AREA_RATIO:
+            continue
+        if any(rect.intersects(fitz.Rect(box)) for box in text_boxes):
+            continue
+        regions.append(rect)
+    return regions
+
+
+class OCROptions:
+    """单页识别参数"""
+
+    def __init__(self, dpi=None, use_text_layer=True, policy=None, preprocess=DEFAULT_PREPROCESS,
+                 orientation=ORIENTATION_AUTO, templates=None, detect_tables=True):
+        """
+        Args:
+            dpi (int, optional): 固定渲染分辨率，None表示按分辨率策略自适应
+            use_text_layer (bool): 页面自带可用文本层时直接使用文本层
+            policy (ResolutionPolicy, optional): 自适应分辨率策略
+            preprocess: 预处理步骤名称列表，可用步骤见 PREPROCESS_STAGES
+            orientation (str): 方向判断模式，auto / upright / cls
+            templates (TemplateRegistry, optional): 版面模板，匹配到模板的扫描页只识别模板中的区域
+            detect_tables (bool): 根据表格线还原表格网格
+        """
+        self.dpi = dpi
+        self.use_text_layer = use_text_layer
+        self.policy = policy or DEFAULT_RESOLUTION_POLICY
+        self.preprocess = tuple(preprocess)
+        self.orientation = orientation
+        self.templates = templates
+        self.detect_tables = detect_tables
+
+    def cache_params(self):
+        """影响识别结果的参数"""
+        return {
+            "dpi": self.dpi,
+            "use_text_layer": self.use_text_layer,
+            "resolution_policy": vars(self.policy),
+            "preprocess": list(self.preprocess),
+            "orientation": self.orientation,
+            "templates": self.templates.signature() if self.templates else None,
+            "detect_tables": self.detect_tables,
+        }
+
+
+DEFAULT_OCR_OPTIONS = OCROptions()
+
+
+class PageResult:
+    """单页识别结果"""
+
+    def __init__(self, page_num, lines, boxes, scores, source, dpi=None, timings=None, cls_skipped=0,
+                 template=None, labels=None, tables=None):
+        self.page_num = page_num        # 页码（从1开始）
+        self.lines = lines              # 文本行列表
+        self.boxes = boxes              # 每行的四点坐标 [[x, y], ...]，单位pt（PDF页面坐标）
+        self.scores = scores            # 每行的置信度，文本层为1.0
+        self.source = source            # 文本来源: "ocr" 或 "text_layer"
+        self.dpi = dpi                  # 渲染分辨率，未渲染时为None
+        self.timings = timings or {}    # 各阶段耗时（秒）
+        self.cls_skipped = cls_skipped  # 跳过方向分类器的OCR文本行数
+        self.template = template        # 匹配的版面模板名称，未匹配时为None
+        self.labels = labels            # 每行所属的模板区域名称，未使用模板时为None
+        self.tables = tables or []      # 由表格线还原出的表格网格 TableGrid 列表
+
+    @property
+    def fields(self):
+        """按模板区域名称合并的文本: {区域名称: 文本}，未使用模板时为空"""
+        fields = {}
+        for label, line in zip(self.labels or [], self.lines):
+            if label:
+                fields[label] = fields[label] + "\n" + line if label in fields else line
+        return fields
+
+    @property
+    def text(self):
+        """带页面标记的页面文本，有表格网格时表格内的文本行整理为Markdown表格"""
+        return format_page_text(self.page_num, layout_with_tables(self.lines, self.boxes, self.tables))
+
+    @property
+    def plain_text(self):
+        """带页面标记的页面文本，按识别顺序逐行输出，不整理表格（供规则提取使用）"""
+        return format_page_text(self.page_num, self.lines)
+
+    def __str__(self):
+        template = f", 模板 {self.template}" if self.template else ""
+        return (f"第 {self.page_num} 页: 来源 {self.source}{template}, DPI {self.dpi}, "
+                f"行数 {len(self.lines)}, 跳过方向分类 {self.cls_skipped} 行, "
+                f"耗时 {self.timings.get('total', 0):.3f}秒")
+
+
+def ocr_image(engine, image, cls=True):
+    """
+    使用PaddleOCR识别图片
+
+    Args:
+        engine: PaddleOCR引擎
+        image (np.ndarray): 图片
+        cls (bool): 是否运行方向分类器
+
+    Returns:
+        tuple: (文本行列表, 文本框列表（图片像素坐标）, 置信度列表)
+    """
+    result = engine.ocr(image, cls=cls)
+
+    lines = []
+    boxes = []
+    scores = []
+    if result and result[0]:
+        for box, (text, score) in result[0]:
+            if text:  # 确保有识别结果
+                lines.append(text)
+                boxes.append(box)
+                scores.append(float(score))
+    return lines, boxes, scores
+
+
+def crop_text_line(image, box):
+    """
+    按检测框透视变换裁剪出文本行图片
+
+    Args:
+        image (np.ndarray): 页面图片
+        box: 四点坐标
+
+    Returns:
+        np.ndarray: 裁剪出的文本行（BGR）
+    """
+    points = np.array(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    # 竖排文本旋转为横排
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    if crop.ndim == 2:
+        crop = cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR)
+    return crop
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def _to_page_coords(box, dpi, clip=None):
+    """将图片像素坐标转换为PDF页面坐标"""
+    scale = 72 / dpi
+    offset_x, offset_y = (clip.x0, clip.y0) if clip else (0, 0)
+    return [[x * scale + offset_x, y * scale + offset_y] for x, y in box]
+
+
+def _add_timing(timings, name, start):
+    timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+
+def find_table_grids(image, dpi, clip=None, timings=None):
+    """在渲染、预处理后的图片上检测表格网格，返回页面坐标的 TableGrid 列表"""
+    start = time.perf_counter()
+    grids = grids_to_page(detect_table_grids(image), dpi, clip)
+    if timings is not None:
+        _add_timing(timings, "table_grid", start)
+    return grids
+
+
+def _render_and_ocr(engine, page, dpi, clip, timings, options, cls, confirm=False):
+    start = time.perf_counter()
+    pix, gray = render_page(page, dpi, clip)
+    _add_timing(timings, "render", start)
+    start = time.perf_counter()
+    image = preprocess_image(gray, options.preprocess)
+    _add_timing(timings, "preprocess", start)
+    # 表格检测直接使用OCR的二值化图片，不再单独渲染
+    grids = find_table_grids(image, dpi, clip, timings) if options.detect_tables else []
+    start = time.perf_counter()
+    lines, boxes, scores = ocr_image(engine, image, cls)
+    _add_timing(timings, "ocr", start)
+    if confirm and not cls:
+        # 投影只能确定是横排，抽样确认不是倒置的，倒置时带方向分类器重新识别
+        start = time.perf_counter()
+        upright = sample_upright(engine, [crop_text_line(image, box) for box in boxes])
+        _add_timing(timings, "cls_sample", start)
+        if not upright:
+            cls = True
+            start = time.perf_counter()
+            lines, boxes, scores = ocr_image(engine, image, cls)
+            _add_timing(timings, "ocr", start)
+    return lines, [_to_page_coords(box, dpi, clip) for box in boxes], scores, grids, cls
+
+
+def ocr_region(engine, page, clip=None, options=DEFAULT_OCR_OPTIONS, timings=None, tables=None):
+    """
+    渲染页面（或页面中的区域）并识别
+
+    未指定DPI时由分辨率策略选择，识别置信度偏低时提高DPI重新识别一次；
+    能确定文字为正向时跳过方向分类器（auto 模式下识别后抽样确认，倒置时带方向分类器重新识别）
+
+    Args:
+        engine: PaddleOCR引擎
+        page: fitz.Page 对象
+        clip (fitz.Rect, optional): 只识别页面中的指定区域
+        options (OCROptions): 识别参数
+        timings (dict, optional): 累加各阶段耗时
+        tables (list, optional): 检测到的表格网格追加到该列表
+
+    Returns:
+        tuple: (文本行列表, 文本框列表（页面坐标）, 置信度列表, 实际使用的DPI, 跳过方向分类器的行数)
+    """
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
+    chosen_dpi = options.dpi or options.policy.choose_dpi(page, clip)
+    cls = needs_cls(page, clip, options.orientation)
+    _add_timing(timings, "probe", start)
+
+    lines, boxes, scores, grids, cls = _render_and_ocr(engine, page, chosen_dpi, clip, timings, options, cls,
+                                                       confirm=options.orientation == ORIENTATION_AUTO)
+    if options.dpi is None:
+        retry_dpi = options.policy.next_dpi(page, chosen_dpi, scores, clip)
+        if retry_dpi:
+            retry = _render_and_ocr(engine, page, retry_dpi, clip, timings, options, cls)
+            if _mean(retry[2]) > _mean(scores):
+                lines, boxes, scores, grids, cls = retry
+                chosen_dpi = retry_dpi
+    if tables is not None:
+        tables.extend(grids)
+    return lines, boxes, scores, chosen_dpi, 0 if cls else len(lines)
+
+
+def ocr_pdf_page(engine, page, options=DEFAULT_OCR_OPTIONS, match=None):
+    """
+    识别单个PDF页面
+
+    页面自带可用文本层时直接使用文本层，只对没有文本覆盖的图片区域做OCR；
+    否则匹配版面模板，匹配成功时只识别模板中的区域，未匹配时渲染整页并使用PaddleOCR识别
+
+    Args:
+        engine: PaddleOCR引擎
+        page: fitz.Page 对象
+        options (OCROptions): 识别参数
+        match (TemplateMatch, optional): 同一文件前面页面的模板匹配结果，为 None 时在本页匹配
+            （见 iter_pdf_pages）
+
+    Returns:
+        PageResult: 单页识别结果
+    """
+    page_start = time.perf_counter()
+    timings = {}
+    text_layer = None
+    if options.use_text_layer:
+        start = time.perf_counter()
+        text_layer = extract_text_layer(page)
+        _add_timing(timings, "text_layer", start)
+
+    template = None
+    labels = None
+    tables = []
+    if text_layer is None:
+        if options.templates and match is None:
+            match = options.templates.match(engine, page, options, timings)
+        template = match.template if match else None
+        if template is None:
+            lines, boxes, scores, used_dpi, cls_skipped = ocr_region(engine, page, options=options, timings=timings,
+                                                                     tables=tables)
+        else:
+            lines, boxes, scores, labels = [], [], [], []
+            used_dpi = None
+            cls_skipped = 0
+            for layout_region in template.regions:
+                for rect, reused in match.split(layout_region, page):
+                    if reused is not None:
+                        # 匹配时已经识别过这部分
+                        lines.extend(text for text, _, _ in reused)
+                        boxes.extend(box for _, box, _ in reused)
+                        scores.extend(score for _, _, score in reused)
+                        labels.extend([layout_region.name] * len(reused))
+                        used_dpi = max(used_dpi or 0, match.dpi or 0) or None
+                        continue
+                    region = ocr_region(engine, page, clip=rect, options=options, timings=timings, tables=tables)
+                    lines.extend(region[0])
+                    boxes.extend(region[1])
+                    scores.extend(region[2])
+                    labels.extend([layout_region.name] * len(region[0]))
+                    used_dpi = max(used_dpi or 0, region[3])
+                    cls_skipped += region[4]
+        source = "ocr"
+    else:
+        lines = [text for text, _ in text_layer]
+        boxes = [[[x0, y0], [x1, y0], [x1, y1], [x0, y1]] for _, (x0, y0, x1, y1) in text_layer]
+        scores = [1.0] * len(lines)
+        used_dpi = None
+        cls_skipped = 0
+        if options.detect_tables:
+            start = time.perf_counter()
+            tables.extend(grids_from_drawings(page))
+            _add_timing(timings, "table_grid", start)
+        for rect in find_image_regions(page, [box for _, box in text_layer]):
+            region = ocr_region(engine, page, clip=rect, options=options, timings=timings, tables=tables)
+            lines.extend(region[0])
+            boxes.extend(region[1])
+            scores.extend(region[2])
+            used_dpi = max(used_dpi or 0, region[3])
+            cls_skipped += region[4]
+        source = "text_layer"
+
+    _add_timing(timings, "total", page_start)
+    return PageResult(page.number + 1, lines, boxes, scores, source, used_dpi, timings, cls_skipped,
+                      template.name if template else None, labels, tables)
+
+
+def iter_pdf_pages(engine, pages, options=DEFAULT_OCR_OPTIONS):
+    """
+    逐页识别，按输入的页面顺序返回结果
+
+    pages 可以包含多个文件的页面；每份文件只在第一张扫描页上匹配版面模板，
+    其余页面沿用匹配结果，不再逐页识别匹配区域
+
+    Args:
+        engine: PaddleOCR引擎
+        pages: fitz.Page 对象的可迭代序列
+        options (OCROptions): 识别参数
+
+    Yields:
+        PageResult: 单页识别结果
+    """
+    matches = {}  # 文件对象 id -> 该文件的 TemplateMatch
+    for page in pages:
+        document = id(page.parent)
+        result = ocr_pdf_page(engine, page, options, matches.get(document))
+        if options.templates and result.source == "ocr" and document not in matches:
+            matches[document] = options.templates.carry(result.template)
+        yield result
+
+
+def format_page_text(page_num, lines):
+    """将单页识别结果格式化为带页面标记的文本"""
+    text = f"\n{'='*50}\n"
+    text += f"第 {page_num} 页内容:\n"
+    text += f"{'='*50}\n\n"
+    for line in lines:
+        text += line + '\n'
+    text += '\n'
+    return text
@@ -0,0 +1,568 @@
+import re
+import json
+from decimal import Decimal, InvalidOperation
+import pandas as pd
+
+# PO表格的全部列（与提示词中的表头顺序一致）
+PO_COLUMNS = [
+    "客户公司名称", "客户地址", "客户电话", "客户传真", "采购单号", "请购单号", "付款条件", "税种", "币种",
+    "采购日期", "供应厂商代号", "供应厂商公司名称", "供应厂商地址", "供应商电话", "供应商联系人", "供应商传真",
+    "料件编号", "项次", "品名(MPN)", "规格", "计价单位", "计价数量", "税前单价", "税前金额", "交货日",
+    "采购数量", "含税单价", "含税金额", "采购单位", "税前金额合计", "税后金额合计", "增值税税额合计",
+]
+
+# 每个商品一行的列，其余列在整张订单中只有一个值
+ITEM_COLUMNS = [
+    "项次", "料件编号", "品名(MPN)", "规格", "计价单位", "计价数量", "税前单价", "税前金额", "交货日",
+    "请购单号", "采购数量", "含税单价", "含税金额", "采购单位",
+]
+HEADER_COLUMNS = [column for column in PO_COLUMNS if column not in ITEM_COLUMNS]
+
+# 常见计价单位的完整写法（OCR经常把括号内的说明拆成多行）
+UNIT_NAMES = {
+    "PCS": "PCS(个、台、块、辆)",
+}
+
+# 没有提取到商品时记录的错误
+NO_ITEMS_ERROR = "没有商品行"
+
+# 表头行至少要对应上的商品列数（其中必须有项次）
+MIN_GRID_COLUMNS = 3
+
+# 金额校验允许的误差（单价、金额按位数四舍五入产生）
+AMOUNT_TOLERANCE = Decimal("0.02")
+
+# 打印机控制码，例如 "~I;"、"~T120;"，OCR常把 I 识别为 1
+_CONTROL_CODE = re.compile(r"~[A-Za-z0-9.,:/ ]*[;；]?")
+# OCR在小数点、千分位后插入的空格："1, 000. 000000" -> "1,000.000000"
+_NUMBER_GAP = re.compile(r"(?<=\d[.,])\s+(?=\d)")
+_LABEL_SEP = r"\s*[:：]\s*"
+
+_PATTERNS = {
+    "采购单号": re.compile(r"采购单号" + _LABEL_SEP + r"(\d{3}-\d{10})\s*([一-龥]*采购单)?"),
+    "采购日期": re.compile(r"采购日期" + _LABEL_SEP + r"(\d{2}/\d{2}/\d{2})\s*(\d{2}:\d{2}:\d{2})"),
+    "付款条件": re.compile(r"付款条件" + _LABEL_SEP + r"(\S+)"),
+    "税种": re.compile(r"税种" + _LABEL_SEP + r"([^\n]+)"),
+    "币种": re.compile(r"币种" + _LABEL_SEP + r"([A-Z]{3})"),
+    "供应厂商代号": re.compile(r"供应厂商" + _LABEL_SEP + r"(\w+)"),
+    "供应商联系人": re.compile(r"联系人" + _LABEL_SEP + r"([一-龥A-Za-z]+)"),
+}
+_PHONE = re.compile(r"TEL" + _LABEL_SEP + r"([\d\-/ ]*\d)", re.IGNORECASE)
+_FAX = re.compile(r"FAX" + _LABEL_SEP + r"([\d\-/ ]*\d|/)", re.IGNORECASE)
+_COMPANY = re.compile(r"([一-龥（）()]{4,}?有限公司)")
+_ADDRESS = re.compile(r"[一-龥]+[省市][^\s~]*?[路街道号楼室栋][^\s~]*")
+_TOTALS = {
+    column: re.compile(column + r"\s*[:：]?\s*(\d[\d,]*\.\d+)")
+    for column in ("税前金额合计", "税后金额合计", "增值税税额合计")
+}
+
+# 商品行的开头："1 936010002146(ROHS)"
+_ITEM_START = re.compile(r"^(\d{1,3})\s+(\d{9,})\s*(?:[(（]\s*(R[O0]HS)\s*[)）])?", re.MULTILINE)
+# 商品区域在合计之前结束
+_ITEMS_END = re.compile(r"税前金额合计")
+_REQUISITION_NO = re.compile(r"\d{3}-\d{10}-\d+")
+_DATE = re.compile(r"\b\d{2}/\d{2}/\d{2}\b")
+_DECIMAL = re.compile(r"\d{1,3}(?:,\d{3})+\.\d+|\d+\.\d+")
+_UNIT = re.compile(r"([A-Z]{2,5})\s*[(（]")
+# 品名以字母+数字的图号开头，末尾常带一对空括号
+_PRODUCT_NAME = re.compile(r"^([A-Z]+\d[^\n]*?)(?:\s*[（(]\s*[)）])?\s*$", re.MULTILINE)
+_SPECIFICATION = re.compile(r"依图纸")
+_VERSION_LINE = re.compile(r"^版本\s*[:：].*$", re.MULTILINE)
+# 表头单元格中的括号说明，例如 "品名(MPN)" -> "品名"
+_HEADER_NOTE = re.compile(r"[(（][^)）]*[)）]")
+
+
+class POExtraction:
+    """
+    PO提取结果: 订单级字段（每单一个值）+ 商品列表
+
+    规则提取和大模型提取使用同一个结构，JSON格式为
+    {"header": {列名: 值, ...}, "items": [{列名: 值, ...}, ...]}，
+    订单级字段只出现一次，不随商品行重复
+    """
+
+    def __init__(self, header, items, missing, item_errors):
+        self.header = header              # {列名: 值}，未能提取的列不在其中
+        self.items = items                # [{列名: 值}, ...]
+        self.missing = missing            # 未能可靠提取的订单级列
+        self.item_errors = item_errors    # 商品行无法可靠提取的原因
+
+    @property
+    def items_ok(self):
+        """商品行是否全部可靠提取"""
+        return bool(self.items) and not self.item_errors
+
+    @property
+    def complete(self):
+        """全部列都已可靠提取，不需要调用大模型"""
+        return self.items_ok and not self.missing
+
+    def fill(self, values):
+        """用大模型补全的字段值更新订单级字段"""
+        for column, value in values.items():
+            if column in self.missing and value:
+                self.header[column] = value
+        self.missing = [column for column in self.missing if column not in self.header]
+
+    def rows(self):
+        """按 PO_COLUMNS 的顺序展开成每个商品一行"""
+        return [[item.get(column) or self.header.get(column, "") for column in PO_COLUMNS]
+                for item in self.items]
+
+    def to_dict(self):
+        return {
+            "header": {column: self.header[column] for column in HEADER_COLUMNS if column in self.header},
+            "items": [{column: item[column] for column in ITEM_COLUMNS if column in item} for item in self.items],
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        由 {"header": ..., "items": [...]} 构建，值统一转为字符串，空值视为缺失
+
+        Args:
+            data (dict): 订单数据
+
+        Returns:
+            POExtraction
+        """
+        if not isinstance(data, dict):
+            raise ValueError("订单数据应为JSON对象")
+        header = {column: _to_text(value) for column, value in (data.get("header") or {}).items()
+                  if column in HEADER_COLUMNS and _to_text(value)}
+        items = [_clean_item(item) for item in data.get("items") or [] if isinstance(item, dict)]
+        missing = [column for column in HEADER_COLUMNS if column not in header]
+        return cls(header, items, missing, [] if items else [NO_ITEMS_ERROR])
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_dataframe(self):
+        """展开成每个商品一行、列顺序与 PO_COLUMNS 一致的DataFrame"""
+        return pd.DataFrame(self.rows(), columns=PO_COLUMNS)
+
+    def to_markdown(self):
+        """格式化为每个商品一行的Markdown表格"""
+        text = "| " + " | ".join(PO_COLUMNS) + " |\n"
+        text += "|" + "---|" * len(PO_COLUMNS) + "\n"
+        for row in self.rows():
+            text += "| " + " | ".join(str(cell).replace("|", "\\|") for cell in row) + " |\n"
+        return text
+
+
+def _to_text(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def _clean_item(item):
+    return {column: _to_text(value) for column, value in item.items()
+            if column in ITEM_COLUMNS and _to_text(value)}
+
+
+def _item_order(item):
+    item_no = item.get("项次", "")
+    return (0, int(item_no)) if item_no.isdigit() else (1, 0)
+
+
+def merge_extractions(extractions, failed=()):
+    """
+    合并分段提取的结果
+
+    订单级字段取第一个有值的分段；商品按项次去重（保留列更完整的一项），再按项次排序，
+    没有项次的商品排在最后、保持原顺序。
+    分段的提取错误（没有商品行除外）和调用失败的分段都记录在 item_errors 中，调用方据此判断结果不完整
+
+    Args:
+        extractions: 按原文顺序排列的 [(分段序号, POExtraction), ...]
+        failed: 调用失败的分段 [(分段序号, 原因), ...]
+
+    Returns:
+        POExtraction
+    """
+    header = {}
+    for _, extraction in extractions:
+        for column, value in extraction.header.items():
+            header.setdefault(column, value)
+    items = []
+    by_item_no = {}
+    for _, extraction in extractions:
+        for item in extraction.items:
+            item_no = item.get("项次")
+            if not item_no:
+                items.append(item)
+            elif item_no not in by_item_no:
+                by_item_no[item_no] = len(items)
+                items.append(item)
+            elif len(item) > len(items[by_item_no[item_no]]):
+                items[by_item_no[item_no]] = item
+    items.sort(key=_item_order)
+    missing = [column for column in HEADER_COLUMNS if column not in header]
+    item_errors = [f"第 {number} 段: {error}" for number, extraction in extractions
+                   for error in extraction.item_errors if error != NO_ITEMS_ERROR]
+    item_errors += [f"第 {number} 段提取失败: {reason}" for number, reason in failed]
+    if not items:
+        item_errors.append(NO_ITEMS_ERROR)
+    return POExtraction(header, items, missing, item_errors)
+
+
+class ExtractionStreamParser:
+    """
+    增量解析流式返回的 {"header": {...}, "items": [{...}, ...]}
+
+    每收到一段回答调用一次 feed，header 对象和每个商品对象一结束就可以取出，
+    不需要等待完整的回答；全部收到后 finish 按完整文本重新解析，结果与非流式一致
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.header = None      # header 对象结束后为 {列名: 值}
+        self.items = []         # 已经结束的商品对象
+        self._stack = []        # 当前所在的 { [ 嵌套
+        self._in_string = False
+        self._escape = False
+        self._start = None      # 当前 header/商品对象的开始位置
+        self._start_depth = 0
+        self._pos = 0
+
+    def feed(self, delta):
+        """
+        追加一段回答
+
+        Args:
+            delta (str): 新收到的文本
+
+        Returns:
+            list: 本段文本中结束的商品（已去掉无关列和空值）
+        """
+        self.text += delta
+        new_items = []
+        for pos in range(self._pos, len(self.text)):
+            ch = self.text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"' and self._stack:
+                self._in_string = True
+            elif ch in "{[":
+                # 第2层的对象是 header，第3层、位于数组中的对象是商品
+                if ch == "{" and (len(self._stack) == 1 or (len(self._stack) == 2 and self._stack[1] == "[")):
+                    self._start = pos
+                    self._start_depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if self._start is not None and len(self._stack) == self._start_depth:
+                    item = self._parse_object(self.text[self._start:pos + 1], self._start_depth == 2)
+                    if item is not None:
+                        new_items.append(item)
+                    self._start = None
+        self._pos = len(self.text)
+        self.items.extend(new_items)
+        return new_items
+
+    def _parse_object(self, text, is_item):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(value, dict):
+            return None
+        if not is_item:
+            self.header = {column: _to_text(v) for column, v in value.items()
+                           if column in HEADER_COLUMNS and _to_text(v)}
+            return None
+        item = _clean_item(value)
+        return item or None
+
+    def finish(self):
+        """全部回答收到后得到完整的提取结果"""
+        return parse_extraction_answer(self.text)
+
+
+def parse_extraction_answer(answer):
+    """
+    解析大模型按 {"header": ..., "items": [...]} 返回的JSON
+
+    Args:
+        answer (str): 大模型的回答，可以带 ```json 代码块标记
+
+    Returns:
+        POExtraction: 解析失败时商品列表为空，原因记录在 item_errors 中
+    """
+    start = answer.find("{")
+    end = answer.rfind("}")
+    try:
+        if start < 0 or end < start:
+            raise ValueError("没有找到JSON对象")
+        return POExtraction.from_json(answer[start:end + 1])
+    except ValueError as e:
+        return POExtraction({}, [], list(HEADER_COLUMNS), [f"大模型返回的内容无法解析: {e}"])
+
+
+def clean_ocr_text(text):
+    """去掉打印机控制码，合并数字中被OCR插入的空格"""
+    return _NUMBER_GAP.sub("", _CONTROL_CODE.sub("", text))
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(value.replace(",", ""))
+    except (InvalidOperation, AttributeError):
+        return None
+
+
+def _amount_matches(quantity, price, amount):
+    quantity, price, amount = _to_decimal(quantity), _to_decimal(price), _to_decimal(amount)
+    if None in (quantity, price, amount):
+        return False
+    return abs(quantity * price - amount) <= AMOUNT_TOLERANCE
+
+
+def _normalize_unit(code):
+    return UNIT_NAMES.get(code, code)
+
+
+def _extract_header(text, items_start):
+    """提取订单级字段（抬头、供应商、合计）"""
+    header = {}
+    head = text[:items_start]
+
+    for column, pattern in _PATTERNS.items():
+        match = pattern.search(head)
+        if match:
+            header[column] = "".join(part for part in match.groups() if part) if column == "采购单号" \
+                else " ".join(part.strip() for part in match.groups())
+    if "税种" in header:
+        header["税种"] = "".join(header["税种"].split())
+
+    # 客户信息在“采购单号”之前，供应商信息在“供应厂商”和商品表头之间
+    order_anchor = head.find("采购单号")
+    supplier_anchor = head.find("供应厂商")
+    customer_block = head[:order_anchor] if order_anchor >= 0 else ""
+    supplier_block = head[supplier_anchor:] if supplier_anchor >= 0 else ""
+
+    for block, prefix in ((customer_block, "客户"), (supplier_block, "供应")):
+        if not block:
+            continue
+        company = _COMPANY.search(block)
+        address = next((match.group(0) for match in _ADDRESS.finditer(block)
+                        if "公司" not in match.group(0)), None)
+        phone = _PHONE.search(block)
+        fax = _FAX.search(block)
+        if prefix == "客户":
+            fields = {"客户公司名称": company, "客户地址": address, "客户电话": phone, "客户传真": fax}
+        else:
+            fields = {"供应厂商公司名称": company, "供应厂商地址": address, "供应商电话": phone, "供应商传真": fax}
+        for column, match in fields.items():
+            value = match if isinstance(match, str) or match is None else match.group(1)
+            if value:
+                header[column] = value.strip()
+
+    for column, pattern in _TOTALS.items():
+        match = pattern.search(text, items_start)
+        if match:
+            header[column] = match.group(1)
+    return header
+
+
+def _extract_item(block, item_no, material_no, rohs):
+    """
+    从单个商品的文本块中提取商品列
+
+    Returns:
+        tuple: (商品列字典, 无法可靠提取的原因 或 None)
+    """
+    item = {"项次": item_no, "料件编号": material_no + ("(ROHS)" if rohs else "")}
+    requisition = _REQUISITION_NO.search(block)
+    if requisition:
+        item["请购单号"] = requisition.group(0)
+    dates = _DATE.findall(block)
+    if dates:
+        item["交货日"] = dates[0]
+    if _SPECIFICATION.search(block):
+        item["规格"] = "依图纸"
+    units = _UNIT.findall(block)
+    if units:
+        item["计价单位"] = _normalize_unit(units[0])
+        item["采购单位"] = _normalize_unit(units[-1])
+    name = _PRODUCT_NAME.search(_VERSION_LINE.sub("", block))
+    if name:
+        item["品名(MPN)"] = name.group(1).strip()
+
+    # 去掉请购单号、日期后按出现顺序取数字
+    numbers = _DECIMAL.findall(_DATE.sub(" ", _REQUISITION_NO.sub(" ", block)))
+    if len(numbers) != 6:
+        return item, f"项次 {item_no}: 找到 {len(numbers)} 个数值，应为 6 个"
+    for column, value in zip(("计价数量", "税前单价", "税前金额", "采购数量", "含税单价", "含税金额"), numbers):
+        item[column] = value
+    return item, _check_item(item)
+
+
+def _check_item(item):
+    """校验商品行的金额和完整性，返回无法可靠提取的原因，没有问题时返回 None"""
+    item_no = item.get("项次", "")
+    missing = [column for column in ITEM_COLUMNS if not item.get(column)]
+    if missing:
+        return f"项次 {item_no}: 缺少 {', '.join(missing)}"
+    if not _amount_matches(item["计价数量"], item["税前单价"], item["税前金额"]):
+        return f"项次 {item_no}: 计价数量 × 税前单价 与 税前金额 不符"
+    if not _amount_matches(item["采购数量"], item["含税单价"], item["含税金额"]):
+        return f"项次 {item_no}: 采购数量 × 含税单价 与 含税金额 不符"
+    return None
+
+
+def _check_totals(header, items):
+    """商品金额之和与合计金额校验"""
+    errors = []
+    for column, total_column in (("税前金额", "税前金额合计"), ("含税金额", "税后金额合计")):
+        total = _to_decimal(header.get(total_column))
+        if total is not None and abs(sum(_to_decimal(item[column]) for item in items) - total) > AMOUNT_TOLERANCE:
+            errors.append(f"{column} 之和与 {total_column} 不符")
+    return errors
+
+
+def extract_po_fields(text):
+    """
+    用锚点和预编译的正则从OCR文本中提取PO的32列
+
+    商品行的数值按单价×数量=金额校验，合计按商品金额之和校验，
+    校验不通过或缺少的列记录在结果中，由调用方决定是否交给大模型补全
+
+    Args:
+        text (str): OCR识别出的PDF文本
+
+    Returns:
+        POExtraction: 提取结果
+    """
+    text = clean_ocr_text(text)
+    starts = list(_ITEM_START.finditer(text))
+    items_start = starts[0].start() if starts else len(text)
+    end_match = _ITEMS_END.search(text, items_start)
+    items_end = end_match.start() if end_match else len(text)
+
+    header = _extract_header(text, items_start)
+    items = []
+    item_errors = []
+    for index, match in enumerate(starts):
+        if match.start() >= items_end:
+            break
+        block_end = starts[index + 1].start() if index + 1 < len(starts) else items_end
+        item, error = _extract_item(text[match.end():min(block_end, items_end)], *match.groups())
+        items.append(item)
+        if error:
+            item_errors.append(error)
+
+    if not items:
+        item_errors.append("未找到商品行")
+    elif not item_errors:
+        item_errors = _check_totals(header, items)
+
+    missing = [column for column in HEADER_COLUMNS if not header.get(column)]
+    return POExtraction(header, items, missing, item_errors)
+
+
+def _header_key(text):
+    """表头单元格与列名比较时去掉空白和括号说明"""
+    return "".join(_HEADER_NOTE.sub("", text).split())
+
+
+_GRID_HEADERS = {_header_key(column): column for column in ITEM_COLUMNS}
+
+
+def _grid_items(rows):
+    """
+    从一个表格的单元格中提取商品行
+
+    找到能对应上商品列的表头行，之后有项次的行各是一个商品，
+    项次为空的行是上一商品的续行（单元格内容过长换行），非数字项次的行（例如合计）跳过
+    """
+    for index, row in enumerate(rows):
+        columns = {position: _GRID_HEADERS.get(_header_key(cell)) for position, cell in enumerate(row)}
+        columns = {position: column for position, column in columns.items() if column}
+        if "项次" in columns.values() and len(columns) >= MIN_GRID_COLUMNS:
+            break
+    else:
+        return []
+
+    items = []
+    current = None
+    for row in rows[index + 1:]:
+        values = {column: clean_ocr_text(row[position]).strip() for position, column in columns.items()}
+        item_no = values["项次"]
+        if item_no.isdigit():
+            current = {column: value for column, value in values.items() if value}
+            items.append(current)
+        elif not item_no and current is not None:
+            for column, value in values.items():
+                if value:
+                    current[column] = f"{current[column]} {value}" if current.get(column) else value
+        elif item_no:
+            current = None
+    for item in items:
+        for column in ("计价单位", "采购单位"):
+            if column in item:
+                item[column] = _normalize_unit(item[column])
+    return items
+
+
+def apply_table_grids(extraction, tables):
+    """
+    用表格线还原出的单元格补全规则提取的商品行
+
+    规则按文本行匹配商品，表格中一个单元格换行、列顺序与规则预期不同时无法可靠提取；
+    表格的表头行按列名对应到商品列后，每行直接得到各列的值，
+    与规则提取的同一项次合并（表格中的值优先），重新按金额和合计校验
+
+    Args:
+        extraction (POExtraction): 规则提取的结果
+        tables: 每个表格的单元格文本（TableGrid.assign 的结果）列表
+
+    Returns:
+        POExtraction: 表格中没有可识别的商品表时原样返回 extraction
+    """
+    grid_items = [item for rows in tables for item in _grid_items(rows)]
+    if not grid_items:
+        return extraction
+    items = [dict(item) for item in extraction.items]
+    by_item_no = {item["项次"]: item for item in items if item.get("项次")}
+    for grid_item in grid_items:
+        item = by_item_no.get(grid_item["项次"])
+        if item is None:
+            item = by_item_no[grid_item["项次"]] = {}
+            items.append(item)
+        item.update(grid_item)
+    items.sort(key=_item_order)
+    item_errors = [error for error in map(_check_item, items) if error] or _check_totals(extraction.header, items)
+    return POExtraction(extraction.header, items, extraction.missing, item_errors)
+
+
+def parse_field_answer(answer, columns):
+    """
+    解析大模型按 “列名：值” 逐行返回的字段
+
+    Args:
+        answer (str): 大模型的回答
+        columns: 需要的列名
+
+    Returns:
+        dict: {列名: 值}
+    """
+    values = {}
+    for line in answer.splitlines():
+        line = line.strip().strip("|").strip()
+        for column in columns:
+            if line.startswith(column):
+                value = line[len(column):].lstrip(" :：|").strip()
+                if value:
+                    values[column] = value
+    return values
@@ -0,0 +1,56 @@
+from tools.po_fields import HEADER_COLUMNS, ITEM_COLUMNS
+
+# 提示词版本，修改提示词后递增，大模型回答缓存自动失效
+PROMPT_VERSION = 2
+
+# 提取使用的采样参数：temperature 为0时同样的输入得到同样的表格
+DEFAULT_LLM_PARAMS = {"temperature": 0}
+
+# 表格提取的系统提示词
+TABLE_SYSTEM_PROMPT = ("你是一个专业的采购单信息提取助手，负责从OCR识别出的PDF文本中提取订单信息并输出为JSON。"
+                       "需要注意的是，文本中的表格并不一定是传统意义上的有框表格，也可能是几段规律的文字排版，"
+                       "请根据数据内容重新对齐标签名。")
+
+# 字段补全的系统提示词
+FIELDS_SYSTEM_PROMPT = "你是一个专业的采购单信息提取助手，负责从PDF文本中找出指定字段的值。"
+
+
+def build_table_prompt(content):
+    """完整提取PO的提示词：订单级字段只输出一次，商品输出为列表"""
+    header_fields = ", ".join(f'"{column}": ""' for column in HEADER_COLUMNS)
+    item_fields = ", ".join(f'"{column}": ""' for column in ITEM_COLUMNS)
+    return f"""请从以下PDF文本内容中提取采购单信息，输出为JSON。注意：
+1. 文本中的内容可能排版混乱，但标签名位置是正确的，请根据数据内容重新对齐标签名
+2. 部分文字可能是OCR识别错误的，需要根据内容修改错别字，保持数据的准确性和完整性
+3. 只输出JSON，不要输出其他文字
+4. header 中是整张订单只有一个值的字段，每个字段只输出一次；items 中每个商品一项
+5. 找不到的字段值写空字符串
+6. 规格的内容一般为："依图纸"
+7. 请购单号的内容是数字，其格式一定为："xxx-xxxxxxxxxx-x"
+8. 采购单号格式为xxx-xxxxxxxxxx xxxxxx
+9. 采购日期格式为xx/xx/xx xx:xx:xx，日期和时间用空格分开
+10. 供应厂商包括代号、公司名称、地址
+11. 客户公司名称一般在最开头的地方
+12. 数值保持原文的小数位数
+
+输出格式：
+{{"header": {{{header_fields}}},
+ "items": [{{{item_fields}}}]}}
+
+PDF文本内容：
+{content}"""
+
+
+def build_fields_prompt(content, columns):
+    """只补全规则提取失败的订单级字段的提示词"""
+    field_lines = "\n".join(f"{column}：" for column in columns)
+    return f"""请从以下PDF文本内容中找出这些字段的值，文本来自OCR，可能有错别字，请根据内容修正：
+{field_lines}
+
+要求：
+1. 每行输出一个字段，格式为 “字段名：值”，字段名与上面完全一致
+2. 找不到的字段值写 “/”
+3. 不要输出其他文字
+
+PDF文本内容：
+{content}"""
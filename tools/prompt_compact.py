@@ -0,0 +1,235 @@
+import re
+import math
+from tools.po_fields import clean_ocr_text
+from tools.table_grid import layout_with_tables
+
+# 置信度低于该值的OCR文本行视为噪声（文本层的行置信度为1.0）
+MIN_LINE_SCORE = 0.5
+# 每页开头、结尾各取多少行参与页眉页脚的比较
+EDGE_LINES = 5
+# 出现在多少比例的页面开头/结尾时视为重复的页眉页脚
+REPEAT_RATIO = 0.5
+# 参与页眉页脚去重的行至少包含的非数字字符（汉字、字母）数
+MIN_EDGE_TEXT = 4
+
+# format_page_text 加的页面标记
+_BANNER = re.compile(r"^=+$|^第 \d+ 页内容[:：]?$")
+_PAGE_SPLIT = re.compile(r"\n=+\n第 \d+ 页内容[:：]?\n=+\n")
+# 比较页眉页脚时忽略数字（页码、日期）和空白
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+# 有意义的字符：汉字、字母、数字
+_MEANINGFUL = re.compile(r"[0-9A-Za-z一-龥]")
+_CJK = re.compile(r"[一-龥]")
+_ASCII_WORD = re.compile(r"[0-9A-Za-z]+")
+# 商品行的开始："项次 料件编号"，或Markdown表格中以项次开头的行
+_ITEM_START = re.compile(r"^(?:\d{1,3}\s+\d{9,}|\|\s*\d{1,3}\s*\|)")
+
+
+def estimate_tokens(text):
+    """
+    估算文本的token数
+
+    汉字按每字1个token，连续的字母数字按每4个字符1个token，其他非空白字符各1个token；
+    用于比较压缩前后的大小和统计成本，不需要和服务端的计数完全一致
+    """
+    cjk = len(_CJK.findall(text))
+    words = _ASCII_WORD.findall(text)
+    ascii_tokens = sum(math.ceil(len(word) / 4) for word in words)
+    others = len(_SPACES.sub("", text)) - cjk - sum(len(word) for word in words)
+    return cjk + ascii_tokens + others
+
+
+class CompactResult:
+    """压缩后的提示词输入"""
+
+    def __init__(self, pages, tokens_before, removed):
+        """
+        Args:
+            pages: 每页压缩后的文本
+            tokens_before (int): 压缩前的token数
+            removed (dict): 各类被删除的行数
+        """
+        self.pages = pages
+        self.tokens_before = tokens_before
+        self.removed = removed
+
+    @property
+    def text(self):
+        return "\n\n".join(page for page in self.pages if page)
+
+    @property
+    def tokens_after(self):
+        return estimate_tokens(self.text)
+
+    def stats(self):
+        """压缩统计信息"""
+        tokens_after = self.tokens_after
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": tokens_after,
+            "ratio": tokens_after / self.tokens_before if self.tokens_before else 1.0,
+            "removed": dict(self.removed),
+        }
+
+
+def _edge_key(line):
+    """比较页眉页脚用的键：忽略空白和数字；数字为主或文字太少的行返回 None，不参与去重"""
+    text = _SPACES.sub("", line)
+    digits = sum(len(number) for number in _DIGITS.findall(text))
+    letters = len(_MEANINGFUL.findall(text)) - digits
+    if letters < MIN_EDGE_TEXT or digits >= letters:
+        return None
+    return _DIGITS.sub("#", text)
+
+
+def _edge_keys(lines):
+    """
+    每页的页眉、页脚候选行：{(位置, 键): 行号}
+
+    页眉取开头第一个商品行之前的行，按距页首的位置编号；页脚取最后一个商品行之后的行，
+    按距页尾的位置编号（负数），商品行之间的内容不参与比较
+    """
+    items = [index for index, line in enumerate(lines) if _ITEM_START.match(line)]
+    head_end = min(EDGE_LINES, items[0] if items else len(lines))
+    foot_start = max(len(lines) - EDGE_LINES, items[-1] + 1 if items else head_end)
+    keys = {}
+    for index in list(range(head_end)) + list(range(max(foot_start, head_end), len(lines))):
+        key = _edge_key(lines[index])
+        if key is not None:
+            position = index if index < head_end else index - len(lines)
+            keys[(position, key)] = index
+    return keys
+
+
+def _compact(page_lines, removed):
+    """删除噪声行和跨页重复的页眉页脚，page_lines 为每页的文本行列表"""
+    pages = []
+    for lines in page_lines:
+        kept = []
+        for line in lines:
+            if line.startswith("|"):
+                # 还原出的Markdown表格行原样保留
+                kept.append(line)
+                continue
+            line = clean_ocr_text(line).strip()
+            if not _MEANINGFUL.search(line):
+                removed["junk"] += 1
+            else:
+                kept.append(line)
+        pages.append(kept)
+
+    if len(pages) > 1:
+        page_keys = [_edge_keys(lines) for lines in pages]
+        counts = {}
+        for keys in page_keys:
+            for key in keys:
+                counts[key] = counts.get(key, 0) + 1
+        threshold = max(2, math.ceil(len(pages) * REPEAT_RATIO))
+        # 同一位置上在多页重复出现的页眉页脚只保留第一次出现的
+        seen = set()
+        for index, keys in enumerate(page_keys):
+            drop = {line_no for key, line_no in keys.items() if counts[key] >= threshold and key in seen}
+            seen.update(keys)
+            if drop:
+                removed["repeated"] += len(drop)
+                pages[index] = [line for line_no, line in enumerate(pages[index]) if line_no not in drop]
+    return ["\n".join(lines) for lines in pages]
+
+
+def compact_pages(pages, min_score=MIN_LINE_SCORE):
+    """
+    压缩OCR识别结果，作为大模型的输入
+
+    去掉页面标记、低置信度的行、只有符号和打印机控制码的行，以及跨页重复的页眉页脚
+
+    Args:
+        pages: PageResult 列表
+        min_score (float): 低于该置信度的行被删除
+
+    Returns:
+        CompactResult
+    """
+    removed = {"banner": 0, "low_score": 0, "junk": 0, "repeated": 0}
+    page_lines = []
+    for page in pages:
+        removed["banner"] += 3
+        keep = [i for i, score in enumerate(page.scores) if score >= min_score]
+        removed["low_score"] += len(page.lines) - len(keep)
+        blocks = layout_with_tables([page.lines[i] for i in keep], [page.boxes[i] for i in keep], page.tables)
+        page_lines.append([line for block in blocks for line in block.splitlines() if line.strip()])
+    tokens_before = estimate_tokens("".join(page.text for page in pages))
+    return CompactResult(_compact(page_lines, removed), tokens_before, removed)
+
+
+def compact_text(text):
+    """
+    压缩带页面标记的OCR文本（没有置信度信息时使用），按页面标记分页
+
+    Args:
+        text (str): extract_text_from_pdf 返回的文本
+
+    Returns:
+        CompactResult
+    """
+    removed = {"banner": 0, "low_score": 0, "junk": 0, "repeated": 0}
+    page_lines = []
+    for page in _PAGE_SPLIT.split("\n" + text):
+        lines = []
+        for line in page.splitlines():
+            if not line.strip():
+                continue
+            if _BANNER.match(line.strip()):
+                removed["banner"] += 1
+            else:
+                lines.append(line.strip())
+        if lines:
+            page_lines.append(lines)
+    removed["banner"] += 3 * len(_PAGE_SPLIT.findall("\n" + text))
+    return CompactResult(_compact(page_lines, removed), estimate_tokens(text), removed)
+
+
+
+def _split_page(lines, max_tokens):
+    """超长的页面在商品行的开始处切分"""
+    pieces = [[]]
+    tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line)
+        if _ITEM_START.match(line) and pieces[-1] and tokens + line_tokens > max_tokens:
+            pieces.append([])
+            tokens = 0
+        pieces[-1].append(line)
+        tokens += line_tokens
+    return ["\n".join(piece) for piece in pieces]
+
+
+def split_chunks(text, max_tokens):
+    """
+    将压缩后的文本切分为不超过 max_tokens 的若干段，用于分段提取
+
+    按页面切分（CompactResult.text 的页面之间是空行），一页放不下时在商品行的开始处切分，
+    相邻的小页面合并到同一段；单个商品超过 max_tokens 时不再切分
+
+    Args:
+        text (str): 压缩后的文本
+        max_tokens (int): 每段的token数上限
+
+    Returns:
+        list: 每段的文本，顺序与原文一致
+    """
+    pieces = []
+    for page in text.split("\n\n"):
+        if not page.strip():
+            continue
+        if estimate_tokens(page) > max_tokens:
+            pieces.extend(_split_page(page.splitlines(), max_tokens))
+        else:
+            pieces.append(page)
+    chunks = []
+    for piece in pieces:
+        if chunks and estimate_tokens(chunks[-1] + "\n\n" + piece) <= max_tokens:
+            chunks[-1] += "\n\n" + piece
+        else:
+            chunks.append(piece)
+    return chunks
@@ -0,0 +1,105 @@
+import fitz  # PyMuPDF
+import cv2
+import numpy as np
+
+
+class ResolutionPolicy:
+    """
+    自适应渲染分辨率策略
+
+    先用低分辨率快速渲染一次页面估算文字高度，再选择能保证识别精度的最小DPI；
+    识别置信度偏低时再提高DPI重新识别
+    """
+
+    def __init__(self, probe_dpi=100, target_glyph_px=30, min_dpi=150, max_dpi=300,
+                 retry_dpi=400, max_side_px=4000, min_confidence=0.8):
+        """
+        Args:
+            probe_dpi (int): 估算文字高度时的渲染分辨率
+            target_glyph_px (int): 识别时期望的文字像素高度
+            min_dpi (int): 最小渲染分辨率
+            max_dpi (int): 首次识别的最大渲染分辨率
+            retry_dpi (int): 低置信度重新识别时的最大渲染分辨率
+            max_side_px (int): 渲染图片长边的最大像素数（避免A3等大页面生成超大图片）
+            min_confidence (float): 平均置信度低于该值时提高DPI重新识别
+        """
+        self.probe_dpi = probe_dpi
+        self.target_glyph_px = target_glyph_px
+        self.min_dpi = min_dpi
+        self.max_dpi = max_dpi
+        self.retry_dpi = retry_dpi
+        self.max_side_px = max_side_px
+        self.min_confidence = min_confidence
+
+    def estimate_glyph_height(self, page, clip=None):
+        """
+        低分辨率渲染页面，估算文字高度
+
+        Args:
+            page: fitz.Page 对象
+            clip (fitz.Rect, optional): 只估算指定区域
+
+        Returns:
+            float: 文字高度（单位：pt），无法估算时返回 None
+        """
+        scale = self.probe_dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, colorspace=fitz.csGRAY)
+        gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+        binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        # 只保留类似文字的连通域，排除噪点和表格线
+        mask = (heights >= 3) & (heights <= pix.height * 0.05) & (widths <= heights * 3)
+        if not mask.any():
+            return None
+        # 中文字符常被拆成多个笔画连通域，取较高的分位数更接近字高
+        return float(np.percentile(heights[mask], 75)) / scale
+
+    def _side_limit(self, page, clip=None):
+        """按图片长边像素限制计算的最大DPI"""
+        rect = clip or page.rect
+        return self.max_side_px * 72 / max(rect.width, rect.height, 1)
+
+    def choose_dpi(self, page, clip=None):
+        """
+        为页面选择渲染分辨率
+
+        Args:
+            page: fitz.Page 对象
+            clip (fitz.Rect, optional): 只渲染指定区域
+
+        Returns:
+            int: 渲染分辨率
+        """
+        glyph_height = self.estimate_glyph_height(page, clip)
+        if glyph_height is None:
+            dpi = self.max_dpi
+        else:
+            dpi = self.target_glyph_px * 72 / glyph_height
+        dpi = min(max(dpi, self.min_dpi), self.max_dpi, self._side_limit(page, clip))
+        # 取整到25的倍数，方便缓存和统计
+        return max(25, int(round(dpi / 25)) * 25)
+
+    def next_dpi(self, page, dpi, scores, clip=None):
+        """
+        根据识别置信度判断是否需要提高DPI重新识别
+
+        Args:
+            page: fitz.Page 对象
+            dpi (int): 本次识别使用的分辨率
+            scores (list): 本次识别的文本行置信度
+            clip (fitz.Rect, optional): 识别的区域
+
+        Returns:
+            int: 重新识别使用的分辨率，不需要重新识别时返回 None
+        """
+        if not scores or sum(scores) / len(scores) >= self.min_confidence:
+            return None
+        retry = min(int(dpi * 1.5), self.retry_dpi, self._side_limit(page, clip))
+        retry = int(retry / 25) * 25
+        return retry if retry > dpi else None
+
+
+DEFAULT_RESOLUTION_POLICY = ResolutionPolicy()
@@ -0,0 +1,198 @@
+import cv2
+import numpy as np
+
+# 表格线的最短长度占图片宽/高的比例
+MIN_LINE_RATIO = 0.04
+# 同一条表格线在投影上允许的最大间断（像素）
+LINE_MERGE_PX = 4
+# 一条行线/列线需要覆盖表格宽/高的最小比例
+MIN_SPAN_RATIO = 0.6
+# 矢量线宽超过该值（pt）时不当作表格线（例如色块、图片边框）
+MAX_RULE_WIDTH = 3.0
+# 矢量表格线光栅化的比例（像素/pt）
+RULE_RASTER_SCALE = 2.0
+
+
+class TableGrid:
+    """由表格线还原出的表格网格，坐标单位为pt（PDF页面坐标）"""
+
+    def __init__(self, xs, ys):
+        """
+        Args:
+            xs: 从左到右的列线x坐标
+            ys: 从上到下的行线y坐标
+        """
+        self.xs = [float(x) for x in xs]
+        self.ys = [float(y) for y in ys]
+
+    @property
+    def shape(self):
+        """(行数, 列数)"""
+        return len(self.ys) - 1, len(self.xs) - 1
+
+    @property
+    def bbox(self):
+        return self.xs[0], self.ys[0], self.xs[-1], self.ys[-1]
+
+    def contains(self, x, y):
+        x0, y0, x1, y1 = self.bbox
+        return x0 <= x <= x1 and y0 <= y <= y1
+
+    def assign(self, lines, boxes):
+        """
+        将文本行按文本框中心点分配到单元格
+
+        Args:
+            lines: 文本行列表
+            boxes: 每行的四点坐标（pt）
+
+        Returns:
+            list: 二维列表，rows[i][j] 为第 i 行第 j 列单元格的文本（同一单元格的多行以空格连接）
+        """
+        row_count, col_count = self.shape
+        cells = [[[] for _ in range(col_count)] for _ in range(row_count)]
+        if lines:
+            centers = np.asarray(boxes, dtype=np.float32).reshape(len(lines), -1, 2).mean(axis=1)
+            rows = np.searchsorted(self.ys, centers[:, 1]) - 1
+            cols = np.searchsorted(self.xs, centers[:, 0]) - 1
+            inside = (rows >= 0) & (rows < row_count) & (cols >= 0) & (cols < col_count)
+            # 同一单元格内按从上到下、从左到右的顺序拼接
+            for i in np.lexsort((centers[:, 0], centers[:, 1])):
+                if inside[i]:
+                    cells[rows[i]][cols[i]].append(lines[i])
+        return [[" ".join(cell) for cell in row] for row in cells]
+
+    def to_markdown(self, lines, boxes):
+        """将分配到单元格的文本格式化为Markdown表格，第一行作为表头"""
+        rows = self.assign(lines, boxes)
+        if not rows:
+            return ""
+        text = "| " + " | ".join(cell.replace("|", "\\|") for cell in rows[0]) + " |\n"
+        text += "|" + "---|" * len(rows[0]) + "\n"
+        for row in rows[1:]:
+            text += "| " + " | ".join(cell.replace("|", "\\|") for cell in row) + " |\n"
+        return text
+
+    def __repr__(self):
+        return f"TableGrid({self.shape[0]}x{self.shape[1]}, bbox={tuple(round(v, 1) for v in self.bbox)})"
+
+
+def _line_positions(profile, min_count):
+    """在投影中找出超过阈值的连续区间，返回每个区间的中心位置"""
+    hits = np.flatnonzero(profile >= min_count)
+    if hits.size == 0:
+        return []
+    # 间断超过 LINE_MERGE_PX 时视为不同的线
+    breaks = np.flatnonzero(np.diff(hits) > LINE_MERGE_PX)
+    starts = np.concatenate(([hits[0]], hits[breaks + 1]))
+    ends = np.concatenate((hits[breaks], [hits[-1]]))
+    return list((starts + ends) / 2)
+
+
+def detect_table_grids(binary):
+    """
+    从二值化图片中检测表格线并还原表格网格
+
+    用水平、竖直方向的形态学开运算分别提取横线和竖线，
+    横竖线相交组成的每个连通区域视为一张表格
+
+    Args:
+        binary (np.ndarray): 二值化图片，白底黑字
+
+    Returns:
+        list: [(列线x坐标列表, 行线y坐标列表), ...]，单位为像素
+    """
+    height, width = binary.shape[:2]
+    ink = cv2.threshold(binary, 127, 255, cv2.THRESH_BINARY_INV)[1]
+    h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(10, int(width * MIN_LINE_RATIO)), 1))
+    v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(10, int(height * MIN_LINE_RATIO))))
+    horizontal = cv2.morphologyEx(ink, cv2.MORPH_OPEN, h_kernel)
+    vertical = cv2.morphologyEx(ink, cv2.MORPH_OPEN, v_kernel)
+    if not horizontal.any() or not vertical.any():
+        return []
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(cv2.bitwise_or(horizontal, vertical), connectivity=8)
+    grids = []
+    for x, y, w, h, _ in stats[1:count]:
+        h_region = horizontal[y:y + h, x:x + w] > 0
+        v_region = vertical[y:y + h, x:x + w] > 0
+        ys = _line_positions(h_region.sum(axis=1), w * MIN_SPAN_RATIO)
+        xs = _line_positions(v_region.sum(axis=0), h * MIN_SPAN_RATIO)
+        # 至少两个单元格才构成表格，单独的边框不算
+        if len(xs) >= 2 and len(ys) >= 2 and (len(xs) - 1) * (len(ys) - 1) >= 2:
+            grids.append(([x + v for v in xs], [y + v for v in ys]))
+    return grids
+
+
+def grids_to_page(grids, dpi, clip=None):
+    """将像素坐标的网格转换为页面坐标的 TableGrid"""
+    scale = 72 / dpi
+    offset_x, offset_y = (clip.x0, clip.y0) if clip else (0, 0)
+    return [TableGrid([x * scale + offset_x for x in xs], [y * scale + offset_y for y in ys])
+            for xs, ys in grids]
+
+
+def grids_from_drawings(page):
+    """
+    从页面的矢量图形中还原表格网格（用于自带文本层、不需要渲染的页面）
+
+    只取细的水平、竖直线段和细长矩形，光栅化到低分辨率蒙版后按图片的方法检测
+
+    Args:
+        page: fitz.Page 对象
+
+    Returns:
+        list: TableGrid 列表
+    """
+    rect = page.rect
+    width = max(1, int(rect.width * RULE_RASTER_SCALE))
+    height = max(1, int(rect.height * RULE_RASTER_SCALE))
+    canvas = None
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+            elif item[0] == "re":
+                x0, y0, x1, y1 = item[1]
+            else:
+                continue
+            if abs(x1 - x0) > MAX_RULE_WIDTH and abs(y1 - y0) > MAX_RULE_WIDTH:
+                continue
+            if canvas is None:
+                canvas = np.full((height, width), 255, dtype=np.uint8)
+            points = [(int((x - rect.x0) * RULE_RASTER_SCALE), int((y - rect.y0) * RULE_RASTER_SCALE))
+                      for x, y in ((x0, y0), (x1, y1))]
+            cv2.rectangle(canvas, points[0], points[1], 0, thickness=-1)
+    if canvas is None:
+        return []
+    return grids_to_page(detect_table_grids(canvas), 72 * RULE_RASTER_SCALE, rect)
+
+
+def layout_with_tables(lines, boxes, tables):
+    """
+    将表格区域内的文本行替换为Markdown表格，表格外的文本行保持原顺序
+
+    Args:
+        lines: 文本行列表
+        boxes: 每行的四点坐标（pt）
+        tables: TableGrid 列表
+
+    Returns:
+        list: 文本块列表（文本行或Markdown表格）
+    """
+    if not tables:
+        return list(lines)
+    centers = [(sum(x for x, _ in box) / len(box), sum(y for _, y in box) / len(box)) for box in boxes]
+    owner = [next((i for i, table in enumerate(tables) if table.contains(x, y)), None) for x, y in centers]
+    blocks = []
+    emitted = set()
+    for line, table_index in zip(lines, owner):
+        if table_index is None:
+            blocks.append(line)
+        elif table_index not in emitted:
+            # 表格放在它的第一行文本出现的位置
+            emitted.add(table_index)
+            members = [i for i, owned in enumerate(owner) if owned == table_index]
+            blocks.append(tables[table_index].to_markdown([lines[i] for i in members],
+                                                          [boxes[i] for i in members]))
+    return blocks
@@ -1,157 +1,500 @@
 import os
+import sys
 import fitz  # PyMuPDF
-import requests
 import pandas as pd
-from pathlib import Path
-import cv2
-import numpy as np
-from PIL import Image
-from paddleocr import PaddleOCR
 import re
+import itertools
+import contextlib
+from dotenv import load_dotenv
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from tools.ocr_engine import get_ocr_engine, get_engine_lock, prewarm_ocr_engines, resolve_ocr_config
+from tools.ocr_pool import get_page_pool, shutdown_page_pools, DEFAULT_THREADS_PER_WORKER
+from tools.page_ocr import iter_pdf_pages, OCROptions, DEFAULT_PREPROCESS
+from tools.ocr_store import OCRDocument
+from tools.ocr_cache import OCRCache
+from tools.batch_ocr import CrossPageRecognizer, iter_batched_pages
+from tools.orientation import ORIENTATION_AUTO
+from tools.layout_templates import TemplateRegistry
+from tools.po_fields import (POExtraction, ExtractionStreamParser, HEADER_COLUMNS, extract_po_fields, parse_field_answer,
+                             parse_extraction_answer, merge_extractions, apply_table_grids)
+from tools.po_prompt import (build_table_prompt, build_fields_prompt, TABLE_SYSTEM_PROMPT, FIELDS_SYSTEM_PROMPT,
+                             PROMPT_VERSION, DEFAULT_LLM_PARAMS)
+from tools.llm_cache import LLMCache
+from tools.llm_client import LLMError, get_llm_client, close_llm_clients
+from tools.markdown_table import parse_markdown_table
+from tools.column_normalize import normalize_columns, format_summary
+from order.order_info import extract_all_info
+from tools.prompt_compact import compact_pages, compact_text, split_chunks, estimate_tokens, MIN_LINE_SCORE
+
+# OCRCache、LLMCache、TemplateRegistry 以及预热/关闭共享资源的函数由本模块一并导出，供 api/upload.py 使用
+__all__ = [
+    "TableExtractor", "OCRCache", "LLMCache", "TemplateRegistry",
+    "prewarm_ocr_engines", "shutdown_page_pools", "close_llm_clients",
+]
+
+# 从 .env 文件读取大模型接口等配置（已设置的环境变量优先）
+load_dotenv()
+# 大模型接口地址，可以用环境变量 LLM_API_URL 覆盖，例如指向 tools/llm_stub.py 启动的本地替身服务进行离线测试；
+# API密钥不写在代码中，必须通过环境变量 LLM_API_KEY（或 .env 文件）设置
+DEFAULT_API_URL = "https://api.siliconflow.cn/v1/chat/completions"
+DEFAULT_MODEL = "deepseek-ai/DeepSeek-V3"
+
+# process_document 可以保存的文件
+OUTPUT_SINKS = ("raw_text", "ocr", "json", "md", "xlsx")
 
 class TableExtractor:
-    def __init__(self):
-        """初始化API配置"""
-        self.api_key = "sk-gnrmcptblepcptqeigymctpsahtvonsjhlwvtvvvvezzcdpu"
-        self.api_url = "https://api.siliconflow.cn/v1/chat/completions"
-        # 初始化PaddleOCR
-        self.ocr = PaddleOCR(use_angle_cls=True, lang="ch",use_gpu=True)  # 中文模型
-        
+    def __init__(self, ocr_config=None, page_workers=1, threads_per_worker=DEFAULT_THREADS_PER_WORKER,
+                 use_text_layer=True, dpi=None, resolution_policy=None, ocr_cache=None,
+                 preprocess=DEFAULT_PREPROCESS, rec_batch_size=None, orientation=ORIENTATION_AUTO,
+                 layout_templates=None, detect_tables=True, llm_cache=None, llm_params=None, llm_client=None,
+                 llm_options=None, prompt_min_score=MIN_LINE_SCORE, llm_stream=False, llm_chunk_tokens=None,
+                 api_url=None, api_key=None):
+        """
+        初始化API配置
+
+        Args:
+            ocr_config (dict, optional): 覆盖默认PaddleOCR配置的参数
+            page_workers (int): 页面并行识别的工作进程数，1表示在当前进程中逐页识别，
+                None表示按CPU核数自动计算
+            threads_per_worker (int): 每个工作进程的推理线程数
+            use_text_layer (bool): 页面自带可用文本层时直接使用文本层，跳过渲染和OCR
+            dpi (int, optional): 固定渲染分辨率，None表示按文字高度自适应选择
+            resolution_policy (ResolutionPolicy, optional): 自适应分辨率策略
+            ocr_cache (OCRCache, optional): 页面识别结果缓存，重复上传的文件直接使用缓存结果
+            preprocess: 渲染后的预处理步骤名称列表，可用步骤见 tools.page_ocr.PREPROCESS_STAGES
+            rec_batch_size (int, optional): 启用跨页批量识别时的识别批大小，None表示逐页识别
+            orientation (str): 文字方向判断模式，auto 表示探测为横排且抽样确认不是倒置时跳过方向分类器，
+                upright 表示已知文件为正向、始终跳过，cls 表示始终运行方向分类器
+            layout_templates (TemplateRegistry, optional): 客户/供应商版面模板，
+                匹配到模板的扫描页只识别模板中的抬头、明细表、合计等区域
+            detect_tables (bool): 根据表格线在本地还原表格网格，表格内的文本直接整理为Markdown表格
+            llm_cache (LLMCache, optional): 大模型回答缓存，OCR文本不变的文件直接使用缓存的回答
+            llm_params (dict, optional): 覆盖默认采样参数，默认 temperature 为0以保证结果可复现
+            llm_client (LLMClient, optional): 大模型接口客户端，默认使用进程内共享的客户端
+            llm_options (dict, optional): 创建共享客户端的参数（并发数上限、超时、重试次数等），见 LLMClient
+            prompt_min_score (float): 发给大模型前删除置信度低于该值的OCR文本行
+            llm_stream (bool): 大模型提取整张表格时使用流式接口，每个商品生成完就交给后续步骤
+            llm_chunk_tokens (int, optional): 大模型输入超过该token数时按页面/商品切分为多段并发提取，
+                再合并为一张订单；None表示不切分
+            api_url (str, optional): 大模型接口地址，默认读取环境变量 LLM_API_URL
+            api_key (str, optional): API密钥，默认读取环境变量 LLM_API_KEY；未指定 llm_client 时必须设置
+        """
+        self.api_key = api_key or os.getenv("LLM_API_KEY")
+        if not self.api_key and llm_client is None:
+            raise ValueError("未设置大模型API密钥：请设置环境变量 LLM_API_KEY（或写入 .env 文件），"
+                             "离线测试时可以指向 tools/llm_stub.py 并设置任意值")
+        self.api_url = api_url or os.getenv("LLM_API_URL", DEFAULT_API_URL)
+        self.model = os.getenv("LLM_MODEL", DEFAULT_MODEL)
+        self.llm_params = dict(DEFAULT_LLM_PARAMS, **(llm_params or {}))
+        self.llm_cache = llm_cache
+        self._llm_client = llm_client
+        self.llm_options = dict(llm_options or {})
+        self.prompt_min_score = prompt_min_score
+        self.llm_stream = llm_stream
+        self.llm_chunk_tokens = llm_chunk_tokens
+        self.ocr_config = dict(ocr_config or {})
+        if rec_batch_size:
+            # 识别模型内部的批大小与跨页批次保持一致
+            self.ocr_config.setdefault("rec_batch_num", rec_batch_size)
+        self.rec_batch_size = rec_batch_size
+        self.page_workers = page_workers
+        self.threads_per_worker = threads_per_worker
+        self.ocr_options = OCROptions(dpi, use_text_layer, resolution_policy, preprocess, orientation,
+                                      layout_templates, detect_tables)
+        self.ocr_cache = ocr_cache
+        # 最近一次处理的每页信息（文本来源、版面模板、渲染DPI、表格数、跳过方向分类的行数、耗时）
+        self.page_info = []
+        # 最近一次处理的完整识别结果
+        self.ocr_document = None
+        # 最近一次表格提取的方式: rules（规则提取）/ rules+llm（规则提取+大模型补全字段）/ llm
+        self.extraction_mode = None
+        # 最近一次的提取结果（订单级字段 + 商品列表）
+        self.extraction = None
+        # 最近一次发给大模型的输入压缩前后的token数，没有调用大模型时为 None
+        self.prompt_stats = None
+        # 最近一次提取中已经交给后续步骤的商品数（流式提取时随回答增加）
+        self.rows_extracted = 0
+        # 最近一次解析Markdown表格时跳过的行及原因
+        self.rejected_rows = []
+        # 最近一次处理得到的订单表格（已整理）和订单对象
+        self.dataframe = None
+        self.order = None
+        # 最近一次整理表格的修改摘要
+        self.normalize_summary = {}
+
+    @property
+    def llm_client(self):
+        """大模型接口客户端，未指定时使用进程内共享的连接池"""
+        if self._llm_client is None:
+            self._llm_client = get_llm_client(self.api_url, self.api_key, **self.llm_options)
+        return self._llm_client
+
+    @property
+    def ocr(self):
+        """从进程内的引擎注册表获取PaddleOCR，模型只在首次使用时加载一次"""
+        return get_ocr_engine(**self.ocr_config)
+
+    def iter_pages(self, pdf_path):
+        """
+        逐页识别PDF，每页完成后立即返回结构化结果，后续处理可以先从前面的页面开始
+
+        Args:
+            pdf_path: PDF文件路径
+
+        Yields:
+            PageResult: 单页识别结果（文本行、文本框、置信度、耗时）
+        """
+        for _, page_result in self.iter_documents([pdf_path]):
+            yield page_result
+
+    def iter_documents(self, pdf_paths):
+        """
+        按文件、页码顺序识别多个PDF
+
+        启用批量识别（rec_batch_size）时，多个文件的文本行会合并到同一批次中识别
+
+        Args:
+            pdf_paths: PDF文件路径列表
+
+        Yields:
+            tuple: (文件下标, PageResult)
+        """
+        for pdf_path in pdf_paths:
+            if not os.path.exists(pdf_path):
+                raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
+
+        docs = []
+        try:
+            for pdf_path in pdf_paths:
+                docs.append(fitz.open(pdf_path))
+            # 所有文件的页面: [(文件下标, 页面下标), ...]
+            slots = [(doc_index, page_index) for doc_index, doc in enumerate(docs)
+                     for page_index in range(len(doc))]
+
+            # 先查询缓存，只识别未命中的页面
+            cache_keys = [None] * len(slots)
+            cached_results = [None] * len(slots)
+            if self.ocr_cache is not None:
+                cache_params = self.cache_params()
+                for slot, (doc_index, page_index) in enumerate(slots):
+                    cache_keys[slot] = self.ocr_cache.make_key(docs[doc_index][page_index], cache_params)
+                    cached_results[slot] = self.ocr_cache.get(cache_keys[slot])
+            missing = [slot for slot in range(len(slots)) if cached_results[slot] is None]
+            missing_pages = (docs[slots[slot][0]][slots[slot][1]] for slot in missing)
+            # 进程内识别时共享的引擎可能同时被其他线程（其他上传任务）使用，每次识别持有推理锁
+            engine_lock = get_engine_lock(**self.ocr_config)
+
+            if self.rec_batch_size:
+                # 批量模式：逐页检测，多个页面的文本行凑满批次后统一识别
+                recognizer = CrossPageRecognizer(self.ocr, self.rec_batch_size)
+                page_results = iter_batched_pages(recognizer, missing_pages, self.ocr_options)
+            elif self.page_workers != 1 and len(missing) > 1:
+                # 多进程模式：各工作进程并行渲染和识别页面，按页码顺序返回，工作进程有各自的引擎
+                engine_lock = contextlib.nullcontext()
+                pool = get_page_pool(self.page_workers, self.threads_per_worker, self.ocr_config)
+                page_results = itertools.chain.from_iterable(
+                    pool.iter_pages(pdf_paths[doc_index],
+                                    [slots[slot][1] for slot in missing if slots[slot][0] == doc_index],
+                                    self.ocr_options)
+                    for doc_index in range(len(docs))
+                )
+            else:
+                page_results = iter_pdf_pages(self.ocr, missing_pages, self.ocr_options)
+
+            for slot, (doc_index, page_index) in enumerate(slots):
+                page_result = cached_results[slot]
+                if page_result is None:
+                    with engine_lock:
+                        page_result = next(page_results)
+                    if self.ocr_cache is not None:
+                        self.ocr_cache.put(cache_keys[slot], page_result)
+                # 缓存的页面可能来自其他文件的其他页码
+                page_result.page_num = page_index + 1
+                print(page_result)
+                yield doc_index, page_result
+        finally:
+            for doc in docs:
+                doc.close()
+
+    def cache_params(self):
+        """影响识别结果的参数，与页面内容哈希一起组成缓存key"""
+        return dict(self.ocr_options.cache_params(), ocr_config=resolve_ocr_config(**self.ocr_config))
+
     def extract_text_from_pdf(self, pdf_path):
         """从PDF中提取文本内容，使用PaddleOCR识别"""
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
             
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            print("jiaojiao",doc,type(doc))
-            # 获取PDF页数
-            total_pages = len(doc)
-            # print(f"PDF总页数: {total_pages}")
-            
-            for page_num, page in enumerate(doc, 1):
-                # print(f"正在处理第 {page_num}/{total_pages} 页...")
-                
-                # 将PDF页面转换为图片
-                pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))  # 300 DPI
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                # 转换为OpenCV格式
-                img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-                
-                # 图像预处理
-                gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-                thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-                
-                # 使用PaddleOCR进行识别
-                
-                result = self.ocr.ocr(thresh, cls=True)
-                print(f"result{result}")
-                # 添加页面标记和内容
-                text += f"\n{'='*50}\n"
-                text += f"第 {page_num} 页内容:\n"
-                text += f"{'='*50}\n\n"
-                
-                # 处理识别结果
-                if result:
-                    for line in result[0]:
-                        if line[1][0]:  # 确保有识别结果
-                            text += line[1][0] + '\n'
-                
-                text += '\n'
-            
-            doc.close()
-            
-            # 打印提取的文本预览
-            # print("\n提取的文本预览:")
-            # print(text[:500] + "..." if len(text) > 500 else text)
-            
-            return text
+            self.page_info = []
+            page_results = []
+            for page_result in self.iter_pages(pdf_path):
+                self.page_info.append({
+                    "page": page_result.page_num,
+                    "source": page_result.source,
+                    "template": page_result.template,
+                    "dpi": page_result.dpi,
+                    "tables": len(page_result.tables),
+                    "cls_skipped": page_result.cls_skipped,
+                    "timings": page_result.timings,
+                })
+                page_results.append(page_result)
+            # 保留完整的识别结果（文本框、置信度），供后续版面分析和复查使用
+            self.ocr_document = OCRDocument.from_pages(page_results)
+            print(f"跳过方向分类器的文本行: {sum(info['cls_skipped'] for info in self.page_info)}")
+            print(f"根据表格线还原的表格: {sum(info['tables'] for info in self.page_info)}")
+            if self.ocr_cache is not None:
+                print(f"OCR缓存统计: {self.ocr_cache.stats()}")
+            return "".join(page_result.text for page_result in page_results)
         except Exception as e:
             raise Exception(f"PDF文件处理失败: {str(e)}")
         
-    def call_deepseek_api(self, content,prompt):
-        """调用DeepSeek API进行表格提取和排版"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
+    def extract_texts_from_pdfs(self, pdf_paths):
+        """
+        批量提取多个PDF的文本内容，启用批量识别时多个文件共用识别批次
 
+        Args:
+            pdf_paths: PDF文件路径列表
 
-        data = {
-            "model": "deepseek-ai/DeepSeek-V3",
-            "messages": [
-                {"role": "system", "content": "你是一个专业的表格提取和排版助手，负责从PDF文本中提取表格内容并转换为规范的Markdown格式。需要注意的是，文本中的表格并不一定是传统意义上的有框表格，也可能是几段规律的文字排版，请根据数据内容重新对齐标签名，并整理成规范的Markdown表格格式。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7
-        }
-        
+        Returns:
+            list: 每个文件的文本内容，与 pdf_paths 顺序一致
+        """
+        texts = [""] * len(pdf_paths)
+        try:
+            for doc_index, page_result in self.iter_documents(pdf_paths):
+                texts[doc_index] += page_result.text
+            return texts
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            raise Exception(f"PDF文件处理失败: {str(e)}")
+
+    def call_deepseek_api(self, content, prompt=None, system_prompt=TABLE_SYSTEM_PROMPT, on_delta=None,
+                          raise_errors=False):
+        """
+        调用DeepSeek API进行表格提取和排版，未指定提示词时使用完整的表格提取提示词
+
+        指定 on_delta 时使用流式接口，每收到一段回答调用一次 on_delta（命中缓存时整段调用一次），
+        返回值仍是完整的回答；已经收到部分回答后接口出错时抛出 LLMError。
+        接口出错时默认返回原始内容，raise_errors 为 True 时抛出 LLMError
+        """
+        if prompt is None:
+            prompt = build_table_prompt(content)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+        cache_key = None
+        if self.llm_cache is not None:
+            cache_key = self.llm_cache.make_key(self.model, messages, self.llm_params, PROMPT_VERSION)
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                print("使用缓存的API结果")
+                if on_delta is not None:
+                    on_delta(cached)
+                return cached
+
+        answer = ""
         try:
-            response = requests.post(self.api_url, headers=headers, json=data)
-            response.raise_for_status()
-            result = response.json()
-            return result['choices'][0]['message']['content']
+            if on_delta is None:
+                answer = self.llm_client.chat_sync(messages, self.model, **self.llm_params)
+            else:
+                for delta in self.llm_client.chat_stream_sync(messages, self.model, **self.llm_params):
+                    answer += delta
+                    on_delta(delta)
+            # 只缓存成功的回答，出错时返回的原始内容不缓存
+            if cache_key is not None:
+                self.llm_cache.put(cache_key, answer)
+            return answer
         except Exception as e:
             print(f"调用DeepSeek API时出错: {str(e)}")
+            if on_delta is not None and answer:
+                # 已经交给 on_delta 的部分回答无法撤回，不能再退回原始内容
+                raise LLMError(f"流式回答中断（已收到 {len(answer)} 个字符）: {e}") from e
+            if raise_errors:
+                raise LLMError(f"调用DeepSeek API时出错: {e}") from e
             return content  # 如果API调用失败，返回原始内容
 
+    def call_deepseek_api_chunks(self, chunks, system_prompt=TABLE_SYSTEM_PROMPT):
+        """
+        并发提取多段文本的表格（同时进行中的请求数受客户端的并发数上限限制）
+
+        Args:
+            chunks: 每段的文本
+            system_prompt (str): 系统提示词
+
+        Returns:
+            list: 每段的回答，调用失败的段为对应的异常对象
+        """
+        messages_list = [[{"role": "system", "content": system_prompt},
+                          {"role": "user", "content": build_table_prompt(chunk)}] for chunk in chunks]
+        answers = [None] * len(chunks)
+        cache_keys = [None] * len(chunks)
+        pending = []
+        for i, messages in enumerate(messages_list):
+            if self.llm_cache is not None:
+                cache_keys[i] = self.llm_cache.make_key(self.model, messages, self.llm_params, PROMPT_VERSION)
+                answers[i] = self.llm_cache.get(cache_keys[i])
+            if answers[i] is None:
+                pending.append(i)
+        if len(pending) < len(chunks):
+            print(f"使用缓存的API结果: {len(chunks) - len(pending)}/{len(chunks)} 段")
+
+        results = self.llm_client.chat_many_sync([messages_list[i] for i in pending], self.model,
+                                                 **self.llm_params)
+        for i, result in zip(pending, results):
+            answers[i] = result
+            if isinstance(result, Exception):
+                print(f"调用DeepSeek API时出错（第 {i + 1} 段）: {str(result)}")
+                continue
+            if cache_keys[i] is not None:
+                self.llm_cache.put(cache_keys[i], result)
+        return answers
+
+    def compact_prompt_input(self, pdf_text, pages=None):
+        """
+        压缩发给大模型的OCR文本：去掉页面标记、低置信度和只有符号的行、跨页重复的页眉页脚
+
+        Args:
+            pdf_text (str): OCR识别出的PDF文本
+            pages (list, optional): 对应的 PageResult 列表，提供时按置信度过滤文本行
+
+        Returns:
+            str: 压缩后的文本
+        """
+        if pages is not None:
+            compact = compact_pages(pages, self.prompt_min_score)
+        else:
+            compact = compact_text(pdf_text)
+        self.prompt_stats = compact.stats()
+        print(f"大模型输入: {self.prompt_stats['tokens_before']} -> {self.prompt_stats['tokens_after']} tokens, "
+              f"删除的行: {self.prompt_stats['removed']}")
+        return compact.text
+
+    def _emit_item(self, item, header, on_item):
+        self.rows_extracted += 1
+        if on_item is not None:
+            on_item(item, header)
+
+    def extract_table(self, pdf_text, pages=None, on_item=None):
+        """
+        从OCR文本中提取PO表格
+
+        先用规则提取全部列，商品行不可靠时再按表格线还原出的单元格提取；只有订单级字段缺失时让大模型补全这些字段，
+        商品行无法可靠提取时才让大模型提取整张表格，发给大模型的文本先经过压缩
+
+        Args:
+            pdf_text (str): OCR识别出的PDF文本
+            pages (list, optional): 对应的 PageResult 列表，用于规则提取和压缩大模型输入
+            on_item (callable, optional): on_item(商品, 订单级字段)，每提取出一个商品调用一次；
+                流式提取时在回答生成过程中调用
+
+        Returns:
+            POExtraction: 订单级字段 + 商品列表
+        """
+        self.prompt_stats = None
+        self.rows_extracted = 0
+        # 规则按文本行匹配商品，使用不含Markdown表格的逐行文本
+        rule_text = "".join(page.plain_text for page in pages) if pages else pdf_text
+        extraction = extract_po_fields(rule_text)
+        if not extraction.items_ok and pages:
+            # 按文本行没能可靠提取商品时，用表格线还原出的单元格补全商品行
+            extraction = apply_table_grids(extraction, [grid.assign(page.lines, page.boxes)
+                                                        for page in pages for grid in page.tables])
+        if extraction.complete:
+            self.extraction_mode = "rules"
+            print("\n规则提取完成，无需调用API")
+            for item in extraction.items:
+                self._emit_item(item, extraction.header, on_item)
+            return extraction
+
+        if extraction.items_ok:
+            self.extraction_mode = "rules+llm"
+            print(f"\n规则提取缺少字段 {extraction.missing}，正在调用API补全...")
+            content = self.compact_prompt_input(pdf_text, pages)
+            try:
+                answer = self.call_deepseek_api(content, build_fields_prompt(content, extraction.missing),
+                                                FIELDS_SYSTEM_PROMPT, raise_errors=True)
+                extraction.fill(parse_field_answer(answer, extraction.missing))
+            except LLMError as e:
+                # 原始OCR文本不能当作回答解析；记录错误，调用方据此把结果标记为不完整
+                extraction.item_errors.append(f"大模型补全字段失败，缺少 {extraction.missing}: {e}")
+            for item in extraction.items:
+                self._emit_item(item, extraction.header, on_item)
+            return extraction
+
+        self.extraction_mode = "llm"
+        print(f"\n规则提取失败（{'; '.join(extraction.item_errors)}），正在调用API处理文本...")
+        content = self.compact_prompt_input(pdf_text, pages)
+        chunks = None
+        if self.llm_chunk_tokens and estimate_tokens(content) > self.llm_chunk_tokens:
+            chunks = split_chunks(content, self.llm_chunk_tokens)
+        if chunks and len(chunks) > 1:
+            # 各段并发提取，订单级字段取第一个有值的段，商品按项次去重排序
+            print(f"输入分为 {len(chunks)} 段并发提取")
+            self.prompt_stats["chunks"] = len(chunks)
+            answers = list(enumerate(self.call_deepseek_api_chunks(chunks), 1))
+            # 调用失败的段记录在 item_errors 中，不能当作该段没有商品
+            extraction = merge_extractions(
+                [(number, parse_extraction_answer(answer)) for number, answer in answers
+                 if not isinstance(answer, Exception)],
+                [(number, str(answer)) for number, answer in answers if isinstance(answer, Exception)])
+            for item in extraction.items:
+                self._emit_item(item, extraction.header, on_item)
+        elif self.llm_stream:
+            parser = ExtractionStreamParser()
+            emitted = []
+
+            def on_delta(delta):
+                for item in parser.feed(delta):
+                    emitted.append(item)
+                    self._emit_item(item, parser.header or {}, on_item)
+
+            try:
+                extraction = parse_extraction_answer(self.call_deepseek_api(content, on_delta=on_delta))
+            except LLMError as e:
+                # 回答中途中断：保留已经交出的商品，标记为不完整
+                header = parser.header or {}
+                extraction = POExtraction(header, emitted, [column for column in HEADER_COLUMNS if column not in header],
+                                          [f"大模型回答中断，只收到前 {len(emitted)} 个商品: {e}"])
+        else:
+            extraction = parse_extraction_answer(self.call_deepseek_api(content))
+            for item in extraction.items:
+                self._emit_item(item, extraction.header, on_item)
+        if extraction.item_errors:
+            print(f"API提取失败: {'; '.join(extraction.item_errors)}")
+        return extraction
+
+    def md_to_dataframe(self, md_content):
+        """
+        将Markdown表格（或结构化的提取结果 POExtraction）转换为DataFrame
+
+        列数不一致等无法解析的行记录在 self.rejected_rows 中
+
+        Returns:
+            DataFrame: 没有有效数据行时为空
+        """
+        if isinstance(md_content, POExtraction):
+            # 结构化的提取结果直接展开为DataFrame，不需要解析Markdown
+            self.rejected_rows = []
+            return md_content.to_dataframe()
+        df, self.rejected_rows = parse_markdown_table(md_content)
+        if self.rejected_rows:
+            print(f"跳过无法解析的表格行: {len(self.rejected_rows)} 行，详见 rejected_rows")
+        return df
+
     def md_to_excel(self, md_content, excel_path):
-        """将Markdown表格转换为Excel文件"""
+        """将Markdown表格（或结构化的提取结果 POExtraction）转换为Excel文件"""
+        df = self.md_to_dataframe(md_content)
+        if df.empty:
+            print("警告：没有提取到有效的数据行！")
+            return False
+        return self._save_excel(df, excel_path)
+
+    def _save_excel(self, df, excel_path):
+        """保存DataFrame为Excel文件"""
         try:
-            # 移除可能的markdown标记
-            content = md_content.strip()
-            if content.startswith('```markdown'):
-                content = content[10:]
-            if content.endswith('```'):
-                content = content[:-3]
-            content = content.strip()
-            
-            # 移除文件开头的多余字符
-            lines = content.split('\n')
-            while lines and not lines[0].strip().startswith('|'):
-                lines.pop(0)
-            content = '\n'.join(lines)
-            
-            print("\n处理前的表格内容:")
-            print(content)
-            
-            # 分割行
-            lines = content.split('\n')
-            
-            # 移除空行
-            lines = [line for line in lines if line.strip()]
-            
-            print("\n处理后的行数:", len(lines))
-            
-            # 提取表头
-            header = lines[0].strip('|').split('|')
-            header = [h.strip() for h in header]
-            header = [h for h in header if h]  # 移除空列
-            print("\n表头:", header)
-            
-            # 提取数据行
-            data = []
-            for line in lines[2:]:  # 跳过表头和分隔行
-                if line.strip('|').strip():  # 确保不是空行
-                    row = line.strip('|').split('|')
-                    row = [cell.strip() for cell in row]
-                    row = [cell for cell in row if cell]  # 移除空列
-                    print("\n处理的行:", row)
-                    if len(row) == len(header):  # 确保行数据与表头列数匹配
-                        data.append(row)
-            
-            print("\n提取的数据行数:", len(data))
-            
-            if not data:
-                print("警告：没有提取到有效的数据行！")
-                return False
-            
-            # 创建DataFrame
-            df = pd.DataFrame(data, columns=header)
-            
             # 确保输出目录存在
             os.makedirs(os.path.dirname(excel_path), exist_ok=True)
             
@@ -168,68 +511,90 @@ class TableExtractor:
                 return False
                 
         except Exception as e:
-            print(f"转换过程中出现错误: {str(e)}")
-            print("表格内容预览:")
-            print(content[:500] + "..." if len(content) > 500 else content)
+            print(f"保存Excel文件时出现错误: {str(e)}")
             return False
 
-    def process_document(self, pdf_path, output_path):
-        """处理文档并保存结果"""
+    def process_document(self, pdf_path, output_path, on_item=None, outputs=OUTPUT_SINKS):
+        """
+        处理文档，各步骤之间在内存中传递结果，文件输出是可选的
+
+        处理完成后 self.extraction 为提取结果，self.dataframe 为整理后的订单表格，
+        self.order 为 order.order_info.Order 对象，后续步骤可以直接使用，不需要再读取Excel文件
+
+        Args:
+            pdf_path: PDF文件路径
+            output_path: Markdown表格的保存路径，其他结果保存在同一目录
+            on_item (callable, optional): 每提取出一个商品调用一次，见 extract_table
+            outputs: 需要保存的文件，可选 OUTPUT_SINKS 中的 raw_text（原始文本）、ocr（识别结果）、
+                json（提取结果）、md（Markdown表格）、xlsx（table_data.xlsx 和 table_data_formatted.xlsx）
+
+        Returns:
+            str: Markdown格式的表格
+        """
+        unknown = set(outputs) - set(OUTPUT_SINKS)
+        if unknown:
+            raise ValueError(f"未知的输出: {sorted(unknown)}，可选 {OUTPUT_SINKS}")
         print(f"\n开始处理PDF文件: {pdf_path}")
+        # 确保输出目录存在
+        output_dir = os.path.dirname(output_path)
+        if output_dir and outputs:
+            os.makedirs(output_dir, exist_ok=True)
         
         # 从PDF中提取文本
         pdf_text = self.extract_text_from_pdf(pdf_path)
         
-        # 保存原始PDF文本到文件
-        raw_text_path = os.path.join(os.path.dirname(output_path), 'raw_pdf_text.txt')
-        with open(raw_text_path, 'w', encoding='utf-8') as f:
-            f.write(pdf_text)
-        print(f"\n原始PDF文本已保存到: {raw_text_path}")
+        if "raw_text" in outputs:
+            # 保存原始PDF文本到文件
+            raw_text_path = os.path.join(output_dir, 'raw_pdf_text.txt')
+            with open(raw_text_path, 'w', encoding='utf-8') as f:
+                f.write(pdf_text)
+            print(f"\n原始PDF文本已保存到: {raw_text_path}")
+        
+        if "ocr" in outputs:
+            # 保存完整的识别结果（文本框、置信度）
+            ocr_result_path = os.path.join(output_dir, 'ocr_result.npz')
+            self.ocr_document.save(ocr_result_path)
+            print(f"识别结果已保存到: {ocr_result_path}")
         
-        # 调用DeepSeek API进行表格提取和排版
-        print("\n正在调用API处理文本...")
-        formatted_table = self.call_deepseek_api(pdf_text)
+        # 规则提取表格，必要时调用DeepSeek API
+        self.extraction = self.extract_table(pdf_text, self.ocr_document.pages(), on_item)
+        formatted_table = self.extraction.to_markdown()
         print(formatted_table)
-        # 确保输出目录存在
-        output_dir = os.path.dirname(output_path)
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
         
-        # 处理API返回的内容，移除markdown标记
-        formatted_table = formatted_table.strip()
-        if formatted_table.startswith('```markdown'):
-            formatted_table = formatted_table[10:]
-        if formatted_table.endswith('```'):
-            formatted_table = formatted_table[:-3]
-        formatted_table = formatted_table.strip()
+        if "json" in outputs:
+            # 保存结构化的提取结果（订单级字段只保存一次，商品为列表）
+            json_path = os.path.join(output_dir, 'table_data.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                f.write(self.extraction.to_json(indent=2))
+            print(f"提取结果已保存到: {json_path}")
         
-        # 替换"备注"为"采购单位"
-        formatted_table = formatted_table.replace("备注", "采购单位")
+        if "md" in outputs:
+            # 保存排版后的内容到Markdown文件
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(formatted_table)
         
-        # 保存排版后的内容到Markdown文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(formatted_table)
-            
-        # 转换为Excel文件
-        excel_path = os.path.join(output_dir, 'table_data.xlsx')
-        print(f"\n正在将Markdown表格转换为Excel文件...")
-        print(f"Excel文件将保存到: {excel_path}")
+        # 在内存中整理表格并构建订单对象
+        self.dataframe = self.md_to_dataframe(self.extraction)
+        self.order = None
+        if self.dataframe.empty:
+            print("警告：没有提取到有效的数据行！")
+            return formatted_table
+        self.normalize_summary = self.format_dataframe(self.dataframe)
+        print(f"整理表格: {format_summary(self.normalize_summary)}")
+        self.order = extract_all_info(self.dataframe)
         
-        if self.md_to_excel(formatted_table, excel_path):
-            self.process_excel_file(file_path = "./output/table_data.xlsx")
-            print("Excel转换完成！")
-        else:
-            print("Excel转换失败！")
+        if "xlsx" in outputs:
+            excel_path = os.path.join(output_dir, 'table_data.xlsx')
+            formatted_path = os.path.join(output_dir, 'table_data_formatted.xlsx')
+            print(f"\n正在保存Excel文件: {excel_path}, {formatted_path}")
+            if self._save_excel(self.extraction.to_dataframe(), excel_path) and \
+                    self._save_excel(self.dataframe, formatted_path):
+                print("Excel转换完成！")
+            else:
+                print("Excel转换失败！")
             
         return formatted_table
     
-    def format_datetime(self,datetime_str):
-        if re.search(r'\d{2}/\d{2}/\d{2}\s+\d{2}:\d{2}:\d{2}', datetime_str):
-            return datetime_str
-        
-        # 使用正则表达式匹配并添加空格
-        return re.sub(r'(\d{2}/\d{2}/\d{2})(\d{2}:\d{2}:\d{2})', r'\1 \2', datetime_str)
-
     def split_instrument_name(self, name):
         """
         将仪器名称分割成两部分：主要名称和编号
@@ -250,6 +615,19 @@ class TableExtractor:
         else:
             return name, ''
 
+    def format_dataframe(self, df):
+        """
+        整理订单表格：采购日期补空格、金额去千分位、单位只保留代码、采购单号只保留编号，
+        整列一次处理，直接修改传入的DataFrame
+
+        Args:
+            df (DataFrame): 订单表格
+
+        Returns:
+            dict: 修改摘要，见 tools.column_normalize.normalize_columns
+        """
+        return normalize_columns(df)
+
     def process_excel_file(self,file_path, output_path=None):
         """
         处理Excel文件中的采购日期列
@@ -275,34 +653,16 @@ class TableExtractor:
                 print("错误: 未找到'采购日期'列")
                 return False
             
-            # 记录原始值和转换后的值，用于显示变化
-            changes = []
-            
-            # 转换"采购日期"列中的每个值
-            print("正在处理'采购日期'列...")
-            for i in range(len(df)):
-                original_value = df.at[i, "采购日期"]
-                formatted_value = self.format_datetime(original_value)
-                
-                # 如果值发生了变化，记录下来
-                if original_value != formatted_value:
-                    changes.append((i+2, original_value, formatted_value))  # i+2 是Excel行号（考虑标题行和从1开始计数）
-                
-                # 更新DataFrame中的值
-                df.at[i, "采购日期"] = formatted_value
+            # 整理日期、金额、单位和采购单号列
+            print("正在整理表格...")
+            summary = self.format_dataframe(df)
             
             # 保存处理后的Excel文件
             print(f"正在保存处理后的文件: {output_path}")
             df.to_excel(output_path, index=False)
             
-            # 显示变化的统计信息
-            print(f"\n处理完成! 共修改了 {len(changes)} 个日期时间格式")
-            
-            # 显示前10个变化的详细信息
-            if changes:
-                print("\n前10个修改的详细信息:")
-                for i, (row, old, new) in enumerate(changes[:10]):
-                    print(f"行 {row}: '{old}' -> '{new}'")
+            # 显示修改摘要
+            print(f"\n处理完成! {format_summary(summary)}")
             
             return True
             